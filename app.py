@@ -1,27 +1,182 @@
 import os
 import io
+import re
+import base64
+import secrets
 import logging
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file
+import tempfile
+import time
+import uuid
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import click
+from flask import (Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, session,
+                   send_file, abort, jsonify, make_response, g, has_request_context)
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from flask_bcrypt import Bcrypt
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.local import LocalProxy
 from functools import wraps
-from datetime import datetime
-from openpyxl import Workbook
-from reportlab.pdfgen import canvas
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pdf_cache import PDFCache
+import logging_setup
+from metrics import Registry
+from totals import to_decimal, totals_batch, invoice_totals
+# openpyxl and reportlab are imported inside the export functions: they are
+# slow to import, and most requests and worker boots never export anything.
+
+# --- SQLite Engine Profiles (PRAGMAs applied to every new connection) ---
+SQLITE_PROFILES = {
+    # SQLite's own defaults: rollback journal, synchronous=FULL, no busy wait.
+    'default': {},
+    # Readers no longer block the writer (WAL), commits skip the per-transaction
+    # fsync (safe in WAL), writers wait up to 5s for the lock instead of failing
+    # with "database is locked", and hot pages stay in memory.
+    'production': {
+        'busy_timeout': 5000,  # first, so the pragmas below also wait for locks
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,  # KiB, i.e. 64 MiB per connection
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+def sqlite_pragma_listener(pragmas):
+    """Engine 'connect' listener that runs ``PRAGMA name=value`` for each entry."""
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return apply_pragmas
+
+# --- Server Database Engine Options (PostgreSQL / MySQL) ---
+def server_engine_options():
+    """Connection pool settings for server databases, read from the environment."""
+    return {
+        'pool_size': int(os.environ.get("DB_POOL_SIZE", 5)),
+        'max_overflow': int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        'pool_timeout': int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        # Recycle before server-side idle timeouts (e.g. MySQL wait_timeout) drop connections.
+        'pool_recycle': int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        # Test each connection on checkout so stale ones are replaced instead of failing a request.
+        'pool_pre_ping': os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+    }
+
+def statement_timeout_listener(dialect, timeout_ms):
+    """Engine 'connect' listener capping statement run time for the session."""
+    if dialect == 'postgresql':
+        statement = f"SET statement_timeout = {int(timeout_ms)}"
+    else:  # MySQL / MariaDB: applies to SELECT statements
+        statement = f"SET SESSION max_execution_time = {int(timeout_ms)}"
+
+    def apply_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(statement)
+        cursor.close()
+    return apply_timeout
+
+# --- Secret Keys (shared by every worker and node, rotatable) ---
+# Sessions are signed with SECRET_KEY and still accepted when signed with any
+# of SECRET_KEY_FALLBACKS, so a key can be rotated without logging users out.
+# Keys come from the SECRET_KEY / SECRET_KEY_FALLBACKS (comma-separated)
+# environment variables or, failing that, from SECRET_KEY_FILE: one key per
+# line, current key first. The file is created with a random key on first
+# start; every worker on a node then reads the same key, and copying the file
+# (or setting the variables) gives other nodes the same one.
+def read_secret_keys(path):
+    with open(path, encoding='utf-8') as f:
+        keys = [line.strip() for line in f if line.strip()]
+    if not keys:
+        raise RuntimeError(f"Secret key file {path} is empty")
+    return keys
+
+def write_secret_keys(path, keys, replace=True):
+    """Atomically write ``keys``; with ``replace=False``, leave an existing file alone."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    content = ''.join(key + '\n' for key in keys)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        if replace:
+            os.replace(tmp_path, path)
+        else:
+            try:
+                os.link(tmp_path, path)  # fails if another worker created the file first
+            except FileExistsError:
+                pass
+            except OSError:
+                # No hard links here (FAT/exFAT, some SMB shares): create exclusively instead.
+                try:
+                    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+                except FileExistsError:
+                    pass
+                else:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        f.write(content)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def load_secret_keys(path):
+    """Return (current key, list of older keys still accepted)."""
+    if os.environ.get("SECRET_KEY"):
+        fallbacks = os.environ.get("SECRET_KEY_FALLBACKS", "")
+        return os.environ["SECRET_KEY"], [key.strip() for key in fallbacks.split(',') if key.strip()]
+    if not os.path.exists(path):
+        write_secret_keys(path, [secrets.token_hex(32)], replace=False)
+    for attempt in range(50):
+        try:
+            keys = read_secret_keys(path)
+            break
+        except RuntimeError:
+            # Created without a hard link by another worker that has not written it yet.
+            if attempt == 49:
+                raise
+            time.sleep(0.01)
+    return keys[0], keys[1:]
 
 # --- Flask App Config ---
-app = Flask(__name__)
-app.secret_key = os.urandom(24)
-DB_URL = os.environ.get("DATABASE_URL", "sqlite:///invoices.db")
-app.config['SQLALCHEMY_DATABASE_URI'] = DB_URL
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def load_config(app):
+    """Read the settings from the environment into ``app.config``."""
+    app.config['SECRET_KEY_FILE'] = os.environ.get("SECRET_KEY_FILE", os.path.join(app.instance_path, 'secret_key'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///invoices.db")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_STATEMENT_TIMEOUT'] = int(os.environ.get("DB_STATEMENT_TIMEOUT", 0))  # ms, 0 = no limit
+    app.config['SQLITE_PROFILE'] = os.environ.get("SQLITE_PROFILE", "production")
+    app.config['INVOICES_PER_PAGE'] = int(os.environ.get("INVOICES_PER_PAGE", 50))
+    app.config['PDF_CACHE_DIR'] = os.environ.get("PDF_CACHE_DIR", os.path.join(app.instance_path, 'pdf_cache'))
+    app.config['PDF_CACHE_MAX_BYTES'] = int(os.environ.get("PDF_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    app.config['PDF_LAYOUT'] = os.environ.get("PDF_LAYOUT", "dynamic")  # dynamic or paged
+    app.config['PDF_PAGE_SIZE'] = os.environ.get("PDF_PAGE_SIZE", "A4")  # page size of the paged layout
+    app.config['REPORTS_USE_ROLLUP'] = os.environ.get("REPORTS_USE_ROLLUP", "1") == "1"
+    app.config['EXPORT_WORKERS'] = int(os.environ.get("EXPORT_WORKERS", min(4, os.cpu_count() or 1)))
+    app.config['EXPORT_DIR'] = os.environ.get("EXPORT_DIR", os.path.join(app.instance_path, 'exports'))
+    app.config['EXPORT_RETENTION_HOURS'] = int(os.environ.get("EXPORT_RETENTION_HOURS", 24))
+    app.config['METRICS_TOKEN'] = os.environ.get("METRICS_TOKEN", "")  # bearer token for /metrics; empty = off
+    app.config['LOG_FILE'] = os.environ.get("LOG_FILE", "app.log")
+    app.config['LOG_LEVEL'] = os.environ.get("LOG_LEVEL", "INFO")
+    app.config['LOG_MAX_BYTES'] = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+    app.config['LOG_BACKUP_COUNT'] = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+    app.config['LOG_ROTATE_WHEN'] = os.environ.get("LOG_ROTATE_WHEN") or None  # e.g. midnight; default rotates by size
 
-db = SQLAlchemy(app)
-bcrypt = Bcrypt(app)
+# --- Extensions and Blueprint (bound to an app by create_app) ---
+db = SQLAlchemy()
+bcrypt = Bcrypt()
+bp = Blueprint('main', __name__, cli_group=None)
+# The current app's PDF cache; see create_app.
+pdf_cache = LocalProxy(lambda: current_app.extensions['pdf_cache'])
 
-# --- Logging ---
-logging.basicConfig(filename='app.log', level=logging.INFO,
-                    format='%(asctime)s %(levelname)s: %(message)s')
+# --- Logging (configured by create_app) ---
+request_log = logging.getLogger('invoice.requests')
 
 # --- Company Info ---
 COMPANY = {
@@ -29,10 +184,12 @@ COMPANY = {
     "address": "Kano, Nigeria",
     "phone": "+2348065395103"
 }
-app.jinja_env.globals.update(COMPANY=COMPANY)
-app.jinja_env.globals.update(datetime=datetime)
 
 # --- Models ---
+# Money and rates are exact decimals (Decimal in Python, NUMERIC in the database).
+MONEY = db.Numeric(14, 2)
+RATE = db.Numeric(5, 2)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), unique=True, nullable=False)
@@ -40,46 +197,345 @@ class User(db.Model):
 
 class Invoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    client_name = db.Column(db.String(150), nullable=False)
-    tax_rate = db.Column(db.Float, default=0.0)
-    discount_rate = db.Column(db.Float, default=0.0)
+    client_name = db.Column(db.String(150), nullable=False, index=True)
+    tax_rate = db.Column(RATE, default=0)
+    discount_rate = db.Column(RATE, default=0)
     date_created = db.Column(db.DateTime, default=datetime.utcnow)
-    items = db.relationship('InvoiceItem', backref='invoice', cascade="all, delete-orphan")
+    # Bumped on every edit; drives ETag / Last-Modified on the view and export routes.
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Denormalized totals, kept in sync with the items on every write.
+    subtotal = db.Column(MONEY, default=0)
+    tax_amount = db.Column(MONEY, default=0)
+    discount_amount = db.Column(MONEY, default=0)
+    total = db.Column(MONEY, default=0)
+    items = db.relationship('InvoiceItem', backref='invoice', cascade="all, delete-orphan",
+                            order_by='InvoiceItem.id')
+
+    # Backs keyset pagination of the invoice list (newest first) and, through its
+    # leading column, every date_created range filter and ORDER BY.
+    __table_args__ = (db.Index('ix_invoice_date_created_id', 'date_created', 'id'),)
 
 class InvoiceItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'))
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoice.id'), index=True)
     name = db.Column(db.String(150), nullable=False)
     qty = db.Column(db.Integer, nullable=False)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(MONEY, nullable=False)
+
+class DailyRevenue(db.Model):
+    """Precomputed per-day, per-client totals backing the reports."""
+    __tablename__ = 'daily_revenue'
+    day = db.Column(db.Date, primary_key=True)
+    client_name = db.Column(db.String(150), primary_key=True)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(MONEY, nullable=False, default=0)
+    tax_amount = db.Column(MONEY, nullable=False, default=0)
+    discount_amount = db.Column(MONEY, nullable=False, default=0)
+    total = db.Column(MONEY, nullable=False, default=0)
+
+class SchemaVersion(db.Model):
+    """Single row recording the last migration applied to this database."""
+    __tablename__ = 'schema_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+class ExportJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    invoice_id = db.Column(db.Integer, nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+# --- Metrics (per process, scraped from /metrics in Prometheus text format) ---
+metrics_registry = Registry()
+request_seconds = metrics_registry.histogram(
+    'http_request_duration_seconds', "Request latency.", ('method', 'endpoint', 'status'))
+request_sql_queries = metrics_registry.histogram(
+    'http_request_sql_queries', "SQL statements executed per request.", ('endpoint',),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250))
+request_sql_seconds = metrics_registry.histogram(
+    'http_request_sql_duration_seconds', "Time spent executing SQL per request.", ('endpoint',))
+export_render_seconds = metrics_registry.histogram(
+    'export_render_duration_seconds', "Time to render a single-invoice export.", ('format',))
+
+def start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+def stop_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_started', time.perf_counter())
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+
+# --- Request Instrumentation (one structured log record and metric samples per request) ---
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+
+@bp.after_app_request
+def log_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        request_seconds.observe(elapsed, method=request.method, endpoint=endpoint,
+                                status=response.status_code)
+        request_sql_queries.observe(g.sql_queries, endpoint=endpoint)
+        request_sql_seconds.observe(g.sql_seconds, endpoint=endpoint)
+        duration_ms = round(elapsed * 1000, 2)
+        request_log.info(f"{request.method} {request.path} {response.status_code} {duration_ms}ms", extra={
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+            'sql_queries': g.sql_queries,
+            'sql_ms': round(g.sql_seconds * 1000, 2),
+            'response_bytes': response.content_length,
+            'remote_addr': request.remote_addr,
+            'user_id': session.get('user_id'),
+        })
+    return response
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus scrape target; needs ``Authorization: Bearer <METRICS_TOKEN>``, and is off without one.
+
+    Each server process keeps its own registry, so every sample carries a
+    ``pid`` label: series of different workers never overwrite each other,
+    and ``sum without (pid) (...)`` adds them up.
+    """
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        abort(404)
+    if not secrets.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+        abort(401)
+    return current_app.response_class(metrics_registry.render([('pid', os.getpid())]),
+                                      content_type=metrics_registry.content_type)
 
 # --- Login Required Decorator ---
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 
 # --- Utility: Calculate Totals ---
-def calculate_invoice_totals(invoice):
-    subtotal = sum(item.qty * item.price for item in invoice.items)
-    tax_amount = subtotal * (invoice.tax_rate / 100)
-    discount_amount = subtotal * (invoice.discount_rate / 100)
-    total = subtotal + tax_amount - discount_amount
-    return subtotal, tax_amount, discount_amount, total
+# All totals come from the totals module (integer cents, half-up rounding of
+# tax and discount), so the write path, the backfill and every page or export
+# that reads the stored columns agree to the cent.
+def store_invoice_totals(invoice, lines):
+    """Write the totals of ``lines`` (qty, price pairs) onto the invoice's stored total columns."""
+    (invoice.subtotal, invoice.tax_amount,
+     invoice.discount_amount, invoice.total) = invoice_totals(lines, invoice.tax_rate,
+                                                              invoice.discount_rate)
+
+def stored_invoice_totals(invoice):
+    return invoice.subtotal, invoice.tax_amount, invoice.discount_amount, invoice.total
+
+def backfill_invoice_totals(batch_size=1000):
+    """Recompute the stored totals of every invoice from its items, a batch of invoices at a time."""
+    count, last_id = 0, 0
+    while True:
+        invoices = (db.session.query(Invoice.id, Invoice.tax_rate, Invoice.discount_rate,
+                                     Invoice.updated_at)
+                    .filter(Invoice.id > last_id).order_by(Invoice.id).limit(batch_size).all())
+        if not invoices:
+            break
+        last_id = invoices[-1].id
+        lines = (db.session.query(InvoiceItem.invoice_id, InvoiceItem.qty, InvoiceItem.price)
+                 .filter(InvoiceItem.invoice_id.in_([row.id for row in invoices])))
+        totals = totals_batch(((row.id, row.tax_rate, row.discount_rate) for row in invoices), lines)
+        # Recomputing totals does not change the invoice, so keep updated_at (and its ETags) as is.
+        db.session.execute(db.update(Invoice), [
+            {'id': row.id, 'updated_at': row.updated_at,
+             **dict(zip(('subtotal', 'tax_amount', 'discount_amount', 'total'), totals[row.id]))}
+            for row in invoices])
+        count += len(invoices)
+    db.session.commit()
+    return count
+
+@bp.cli.command('backfill-totals')
+def backfill_totals_command():
+    """Recompute stored invoice totals from line items."""
+    count = backfill_invoice_totals()
+    click.echo(f"Backfilled totals for {count} invoice(s).")
+
+# --- Utility: Line Items ---
+def parse_invoice_items(form):
+    """Read the submitted item rows, skipping rows without a name.
 
-app.jinja_env.globals.update(calculate_invoice_totals=calculate_invoice_totals)
+    Rows rendered from existing items also post their ``item_id[]``; it is
+    kept as ``item['id']`` so edits can be matched to the stored rows.
+    """
+    names = form.getlist('item_name[]')
+    qtys = form.getlist('item_qty[]')
+    prices = form.getlist('item_price[]')
+    row_ids = form.getlist('item_id[]')
+    row_ids += [''] * (len(names) - len(row_ids))
+    items = []
+    for name, qty, price, row_id in zip(names, qtys, prices, row_ids):
+        if name.strip():
+            item = {'name': name.strip(), 'qty': int(qty), 'price': to_decimal(price)}
+            if row_id.strip():
+                item['id'] = int(row_id)
+            items.append(item)
+    return items
+
+def insert_invoice_items(invoice_id, items):
+    """Insert all rows in one executemany instead of one ORM object per line."""
+    if items:
+        db.session.execute(db.insert(InvoiceItem),
+                           [{'invoice_id': invoice_id, 'name': item['name'],
+                             'qty': item['qty'], 'price': item['price']} for item in items])
+
+def sync_invoice_items(invoice_id, items):
+    """Apply the submitted rows to an invoice, touching only rows that changed.
+
+    Rows are matched on their posted id; unknown or missing ids are new
+    lines, stored rows that were not posted back are deleted, and matched
+    rows are updated only when a field actually differs. Returns
+    (whether any row was written, whether the set of item names changed).
+    """
+    existing = {row.id: row for row in
+                db.session.query(InvoiceItem.id, InvoiceItem.name, InvoiceItem.qty, InvoiceItem.price)
+                .filter_by(invoice_id=invoice_id)}
+    inserts, updates, renamed = [], [], False
+    for item in items:
+        row = existing.pop(item.get('id'), None)
+        if row is None:
+            inserts.append(item)
+        elif (row.name, row.qty, row.price) != (item['name'], item['qty'], item['price']):
+            updates.append(item)
+            renamed = renamed or row.name != item['name']
+
+    if existing:
+        db.session.execute(db.delete(InvoiceItem).where(InvoiceItem.id.in_(existing))
+                           .execution_options(synchronize_session=False))
+    if updates:
+        db.session.execute(db.update(InvoiceItem), updates)
+    insert_invoice_items(invoice_id, inserts)
+    return bool(existing or updates or inserts), bool(existing or inserts or renamed)
+
+# --- Utility: Conditional GET (ETag / Last-Modified) ---
+def conditional_invoice_response(invoice, kind, build_response):
+    """Answer 304 if the client's copy of this representation is current.
+
+    The strong ETag combines the representation ``kind`` with the invoice
+    id and updated_at, so validating costs only the primary-key lookup
+    that loaded ``invoice``; ``build_response`` runs only on a miss.
+    """
+    updated_at = invoice.updated_at or invoice.date_created
+    etag = f"{kind}-{invoice.id}-{updated_at.strftime('%Y%m%d%H%M%S%f')}"
+    last_modified = updated_at.replace(microsecond=0, tzinfo=timezone.utc)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    elif request.if_modified_since:
+        not_modified = last_modified <= request.if_modified_since
+    else:
+        not_modified = False
+
+    response = current_app.response_class(status=304) if not_modified else make_response(build_response())
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# --- Utility: Invoice Selection (bulk operations) ---
+def parse_date_arg(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        abort(400)
+
+def invoice_selection(args):
+    """SQL criteria for a set of invoices chosen by ``ids``, date range and/or client.
+
+    ``ids`` is a comma-separated list (or repeated argument); ``start`` and
+    ``end`` are inclusive YYYY-MM-DD dates on date_created; ``client`` must
+    match client_name exactly.
+    """
+    criteria = []
+    ids = [part for value in args.getlist('ids') for part in value.split(',') if part.strip()]
+    if ids:
+        try:
+            criteria.append(Invoice.id.in_([int(part) for part in ids]))
+        except ValueError:
+            abort(400)
+    if args.get('start'):
+        criteria.append(Invoice.date_created >= parse_date_arg(args['start']))
+    if args.get('end'):
+        criteria.append(Invoice.date_created < parse_date_arg(args['end']) + timedelta(days=1))
+    if args.get('client', '').strip():
+        criteria.append(Invoice.client_name == args['client'].strip())
+    return criteria
+
+# --- Utility: Keyset Pagination Cursors ---
+def encode_cursor(date_created, invoice_id):
+    raw = f"{date_created.isoformat()}|{invoice_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_part, id_part = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (ValueError, UnicodeDecodeError):
+        abort(400)
+
+# --- Utility: Invoice Summaries (stored totals for listings) ---
+def invoice_summaries(per_page, after=None, before=None):
+    """Return one page of invoices with their totals, plus the next/previous cursors.
+
+    Pages are keyed on (date_created, id), newest first: ``after`` continues
+    past an older cursor and ``before`` walks back towards newer invoices.
+    Only per_page + 1 rows are read through ix_invoice_date_created_id and
+    the totals are stored columns, so cost stays flat as the table grows.
+    """
+    key = db.tuple_(Invoice.date_created, Invoice.id)
+    query = db.session.query(Invoice.id, Invoice.client_name, Invoice.date_created,
+                             Invoice.subtotal, Invoice.tax_amount,
+                             Invoice.discount_amount, Invoice.total)
+    if before:
+        query = query.filter(key > db.tuple_(*decode_cursor(before)))
+        query = query.order_by(Invoice.date_created.asc(), Invoice.id.asc())
+    else:
+        if after:
+            query = query.filter(key < db.tuple_(*decode_cursor(after)))
+        query = query.order_by(Invoice.date_created.desc(), Invoice.id.desc())
+    rows = query.limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    if before:
+        rows = list(reversed(rows[:per_page]))
+        newer, older = has_more, True
+    else:
+        rows = rows[:per_page]
+        newer, older = bool(after), has_more
+    next_cursor = encode_cursor(rows[-1].date_created, rows[-1].id) if rows and older else None
+    prev_cursor = encode_cursor(rows[0].date_created, rows[0].id) if rows and newer else None
+    return rows, next_cursor, prev_cursor
 
 # --- Routes ---
-@app.route('/')
+@bp.route('/')
 @login_required
 def index():
-    invoices = Invoice.query.order_by(Invoice.date_created.desc()).all()
-    return render_template('index.html', invoices=invoices)
+    per_page = request.args.get('per_page', current_app.config['INVOICES_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, 500))
+    invoices, next_cursor, prev_cursor = invoice_summaries(
+        per_page, after=request.args.get('after'), before=request.args.get('before'))
+    return render_template('index.html', invoices=invoices,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username', '').strip()
@@ -89,87 +545,112 @@ def login():
             session['user_id'] = user.id
             session['username'] = user.username
             flash("Login successful!", "success")
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         flash("Invalid credentials", "danger")
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     session.clear()
     flash("Logged out successfully.", "success")
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/invoice/new', methods=['GET', 'POST'])
+@bp.route('/invoice/new', methods=['GET', 'POST'])
 @login_required
 def new_invoice():
     if request.method == 'POST':
         client_name = request.form.get('client_name', '').strip()
-        tax_rate = float(request.form.get('tax_rate', 0))
-        discount_rate = float(request.form.get('discount_rate', 0))
+        tax_rate = to_decimal(request.form.get('tax_rate') or 0)
+        discount_rate = to_decimal(request.form.get('discount_rate') or 0)
         invoice = Invoice(client_name=client_name, tax_rate=tax_rate, discount_rate=discount_rate)
-        db.session.add(invoice)
-        db.session.commit()
+        items = parse_invoice_items(request.form)
+        store_invoice_totals(invoice, ((item['qty'], item['price']) for item in items))
 
-        names = request.form.getlist('item_name[]')
-        qtys = request.form.getlist('item_qty[]')
-        prices = request.form.getlist('item_price[]')
-        for name, qty, price in zip(names, qtys, prices):
-            if name.strip():
-                item = InvoiceItem(invoice_id=invoice.id, name=name.strip(),
-                                   qty=int(qty), price=float(price))
-                db.session.add(item)
+        # One transaction: flush assigns invoice.id, then the items go in as a batch.
+        db.session.add(invoice)
+        db.session.flush()
+        insert_invoice_items(invoice.id, items)
+        update_daily_revenue(added=[rollup_entry(invoice)])
+        reindex_invoice_for_search(invoice.id)
         db.session.commit()
         flash("Invoice created successfully!", "success")
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     return render_template('new_invoice.html')
 
-@app.route('/invoice/<int:invoice_id>/edit', methods=['GET', 'POST'])
+@bp.route('/invoice/<int:invoice_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_invoice(invoice_id):
     invoice = Invoice.query.get_or_404(invoice_id)
     if request.method == 'POST':
+        old_rollup_entry = rollup_entry(invoice)
+        old_client_name = invoice.client_name
         invoice.client_name = request.form.get('client_name', '').strip()
-        invoice.tax_rate = float(request.form.get('tax_rate', 0))
-        invoice.discount_rate = float(request.form.get('discount_rate', 0))
-
-        InvoiceItem.query.filter_by(invoice_id=invoice.id).delete()
-        names = request.form.getlist('item_name[]')
-        qtys = request.form.getlist('item_qty[]')
-        prices = request.form.getlist('item_price[]')
-        for name, qty, price in zip(names, qtys, prices):
-            if name.strip():
-                item = InvoiceItem(invoice_id=invoice.id, name=name.strip(),
-                                   qty=int(qty), price=float(price))
-                db.session.add(item)
+        invoice.tax_rate = to_decimal(request.form.get('tax_rate') or 0)
+        invoice.discount_rate = to_decimal(request.form.get('discount_rate') or 0)
+
+        items = parse_invoice_items(request.form)
+        store_invoice_totals(invoice, ((item['qty'], item['price']) for item in items))
+
+        with db.session.no_autoflush:  # the invoice row is written once, together with updated_at
+            items_changed, item_names_changed = sync_invoice_items(invoice.id, items)
+        changed = items_changed or db.session.is_modified(invoice)
+        if changed:
+            # Set explicitly: an items-only change does not otherwise touch the invoice row.
+            # An unchanged save leaves it alone, so ETags and cached copies stay valid.
+            invoice.updated_at = datetime.utcnow()
+        update_daily_revenue(removed=[old_rollup_entry], added=[rollup_entry(invoice)])
+        if item_names_changed or invoice.client_name != old_client_name:
+            reindex_invoice_for_search(invoice.id)  # the document is only client and item names
         db.session.commit()
+        if changed:
+            pdf_cache.invalidate(invoice.id)
         flash("Invoice updated successfully!", "success")
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     return render_template('edit_invoice.html', invoice=invoice)
 
-@app.route('/invoice/<int:invoice_id>/delete', methods=['POST'])
+@bp.route('/invoice/<int:invoice_id>/delete', methods=['POST'])
 @login_required
 def delete_invoice(invoice_id):
     invoice = Invoice.query.get_or_404(invoice_id)
+    entry = rollup_entry(invoice)
     db.session.delete(invoice)
+    update_daily_revenue(removed=[entry])
+    reindex_invoice_for_search(invoice_id, deleted=True)
     db.session.commit()
+    pdf_cache.invalidate(invoice_id)
     flash("Invoice deleted successfully!", "success")
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/invoice/<int:invoice_id>/view')
+@bp.route('/invoice/<int:invoice_id>/view')
 @login_required
 def view_invoice(invoice_id):
     invoice = Invoice.query.get_or_404(invoice_id)
-    return render_template('view_invoice.html', invoice=invoice)
+    return conditional_invoice_response(
+        invoice, 'view', lambda: render_template('view_invoice.html', invoice=invoice))
 
 # --- Excel Export ---
-@app.route('/invoice/<int:invoice_id>/excel')
-@login_required
-def export_excel(invoice_id):
-    invoice = Invoice.query.get_or_404(invoice_id)
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"Invoice {invoice.id}"
+EXPORT_BATCH_SIZE = 1000
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def invoice_item_rows(invoice_id):
+    """Yield (name, qty, price) for an invoice's items from a server-side cursor."""
+    return db.session.execute(
+        db.select(InvoiceItem.name, InvoiceItem.qty, InvoiceItem.price)
+        .where(InvoiceItem.invoice_id == invoice_id)
+        .order_by(InvoiceItem.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+def write_invoice_xlsx(invoice, output):
+    """Write one invoice as an .xlsx workbook into the file object ``output``.
+
+    The workbook is write-only: rows are serialized as they are appended
+    instead of being kept as cell objects, so memory stays flat however
+    many items the invoice has.
+    """
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=f"Invoice {invoice.id}")
 
     ws.append([COMPANY['name']])
     ws.append([COMPANY['address']])
@@ -179,59 +660,125 @@ def export_excel(invoice_id):
     ws.append([])
 
     ws.append(['Item', 'Qty', 'Price', 'Subtotal'])
-    for item in invoice.items:
-        ws.append([item.name, item.qty, item.price, item.qty * item.price])
+    for name, qty, price in invoice_item_rows(invoice.id):
+        ws.append([name, qty, price, qty * price])
 
-    subtotal, tax_amount, discount_amount, total = calculate_invoice_totals(invoice)
+    subtotal, tax_amount, discount_amount, total = stored_invoice_totals(invoice)
     ws.append([])
     ws.append(['', '', 'Subtotal', subtotal])
     ws.append(['', '', f'Tax ({invoice.tax_rate}%)', tax_amount])
     ws.append(['', '', f'Discount ({invoice.discount_rate}%)', discount_amount])
     ws.append(['', '', 'Total', total])
-
-    output = io.BytesIO()
     wb.save(output)
-    output.seek(0)
-    return send_file(output, as_attachment=True,
-                     download_name=f"invoice_{invoice.id}.xlsx",
-                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
-# --- PDF Export (Print-ready, dynamic height) ---
-@app.route('/invoice/<int:invoice_id>/pdf')
+@bp.route('/invoice/<int:invoice_id>/excel')
 @login_required
-def export_pdf(invoice_id):
+def export_excel(invoice_id):
     invoice = Invoice.query.get_or_404(invoice_id)
-    buffer = io.BytesIO()
 
-    page_width = 420  # half of A4 width
-    line_height = 18
-    top_margin = 30
-    bottom_margin = 40
-    header_height = 120
-    totals_height = 90
+    def build_response():
+        # Spool to a temporary file rather than BytesIO; send_file streams it back in chunks.
+        output = tempfile.TemporaryFile()
+        with export_render_seconds.time(format='xlsx'):
+            write_invoice_xlsx(invoice, output)
+        output.seek(0)
+        return send_file(output, as_attachment=True,
+                         download_name=f"invoice_{invoice.id}.xlsx",
+                         mimetype=XLSX_MIMETYPE, etag=False, conditional=False)
 
-    page_height = top_margin + header_height + len(invoice.items)*line_height + totals_height + bottom_margin
+    return conditional_invoice_response(invoice, 'xlsx', build_response)
 
-    c = canvas.Canvas(buffer, pagesize=(page_width, page_height))
-    y = page_height - top_margin
+# --- Bulk Excel Export (summary + detail sheets) ---
+def write_invoices_xlsx(criteria, output):
+    """Write every invoice matching ``criteria`` into one workbook.
 
+    The Summary sheet has one row per invoice and the Items sheet one row
+    per line item; each is filled by a single streamed query.
+    """
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    summary = wb.create_sheet(title="Summary")
+    summary.append(['Invoice', 'Client', 'Date', 'Tax Rate (%)', 'Discount Rate (%)',
+                    'Subtotal', 'Tax', 'Discount', 'Total'])
+    invoices = db.session.execute(
+        db.select(Invoice.id, Invoice.client_name, Invoice.date_created,
+                  Invoice.tax_rate, Invoice.discount_rate, Invoice.subtotal,
+                  Invoice.tax_amount, Invoice.discount_amount, Invoice.total)
+        .where(*criteria)
+        .order_by(Invoice.date_created, Invoice.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in invoices:
+        summary.append([row.id, row.client_name, row.date_created.strftime('%Y-%m-%d'),
+                        row.tax_rate, row.discount_rate, row.subtotal,
+                        row.tax_amount, row.discount_amount, row.total])
+
+    detail = wb.create_sheet(title="Items")
+    detail.append(['Invoice', 'Client', 'Item', 'Qty', 'Price', 'Subtotal'])
+    items = db.session.execute(
+        db.select(Invoice.id, Invoice.client_name, InvoiceItem.name,
+                  InvoiceItem.qty, InvoiceItem.price)
+        .join(InvoiceItem, InvoiceItem.invoice_id == Invoice.id)
+        .where(*criteria)
+        .order_by(Invoice.date_created, Invoice.id, InvoiceItem.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for invoice_id, client_name, name, qty, price in items:
+        detail.append([invoice_id, client_name, name, qty, price, qty * price])
+    wb.save(output)
+
+@bp.route('/invoices/excel')
+@login_required
+def export_invoices_excel():
+    criteria = invoice_selection(request.args)
+    if not criteria:
+        flash("Choose a date range or invoice IDs to export.", "danger")
+        return redirect(url_for('main.index'))
+    if db.session.query(Invoice.id).filter(*criteria).first() is None:
+        flash("No invoices match the selected range.", "danger")
+        return redirect(url_for('main.index'))
+    output = tempfile.TemporaryFile()
+    write_invoices_xlsx(criteria, output)
+    output.seek(0)
+    return send_file(output, as_attachment=True,
+                     download_name="invoices.xlsx",
+                     mimetype=XLSX_MIMETYPE)
+
+# --- PDF Export ---
+PDF_LAYOUTS = ('dynamic', 'paged')
+PDF_PAGE_SIZES = ('A4', 'A5')  # names in reportlab.lib.pagesizes
+
+def draw_pdf_heading(c, invoice, x, y):
+    """Draw the company block and invoice number/date from (x, y); return the next y."""
     # --- Company Info ---
     c.setFont("Helvetica-Bold", 14)
-    c.drawString(10, y, COMPANY['name'])
+    c.drawString(x, y, COMPANY['name'])
     y -= 20
     c.setFont("Helvetica", 10)
-    c.drawString(10, y, COMPANY['address'])
+    c.drawString(x, y, COMPANY['address'])
     y -= 14
-    c.drawString(10, y, COMPANY['phone'])
+    c.drawString(x, y, COMPANY['phone'])
     y -= 25
 
     # --- Invoice Info ---
     c.setFont("Helvetica-Bold", 12)
-    c.drawString(10, y, f"Invoice #{invoice.id}")
+    c.drawString(x, y, f"Invoice #{invoice.id}")
     y -= 16
     c.setFont("Helvetica", 10)
-    c.drawString(10, y, f"Date: {invoice.date_created.strftime('%Y-%m-%d')}")
-    y -= 25
+    c.drawString(x, y, f"Date: {invoice.date_created.strftime('%Y-%m-%d')}")
+    return y - 25
+
+# --- PDF Layout: Print-ready, dynamic height (single page) ---
+def draw_invoice_pdf_dynamic(c, invoice, items):
+    page_width = 420  # half of A4 width
+    line_height = 18
+    top_margin = 30
+    bottom_margin = 40
+    header_height = 120
+    totals_height = 90
+
+    page_height = top_margin + header_height + len(items)*line_height + totals_height + bottom_margin
+
+    c.setPageSize((page_width, page_height))
+    y = draw_pdf_heading(c, invoice, 10, page_height - top_margin)
 
     # --- Table Header ---
     c.setFont("Helvetica-Bold", 10)
@@ -243,15 +790,15 @@ def export_pdf(invoice_id):
     c.setFont("Helvetica", 10)
 
     # --- Items ---
-    for item in invoice.items:
-        c.drawString(10, y, item.name[:30])
-        c.drawRightString(250, y, str(item.qty))
-        c.drawRightString(320, y, f"{item.price:.2f}")
-        c.drawRightString(410, y, f"{item.qty * item.price:.2f}")
+    for name, qty, price in items:
+        c.drawString(10, y, name[:30])
+        c.drawRightString(250, y, str(qty))
+        c.drawRightString(320, y, f"{price:.2f}")
+        c.drawRightString(410, y, f"{qty * price:.2f}")
         y -= line_height
 
     # --- Totals ---
-    subtotal, tax_amount, discount_amount, total = calculate_invoice_totals(invoice)
+    subtotal, tax_amount, discount_amount, total = stored_invoice_totals(invoice)
     y -= 15
     c.setFont("Helvetica-Bold", 10)
     c.drawRightString(320, y, "Subtotal:")
@@ -267,18 +814,854 @@ def export_pdf(invoice_id):
     c.drawRightString(410, y, f"{total:.2f}")
 
     c.showPage()
+
+# --- PDF Layout: Fixed pages with repeated header and carried-forward subtotal ---
+def draw_invoice_pdf_paged(c, invoice, items, page_size):
+    """Draw the invoice over as many fixed-size pages as it needs.
+
+    Every page repeats the table header; a page that continues onto the
+    next ends with the running subtotal ("Carried forward") and the next
+    page starts with it ("Brought forward"). Items are consumed one page at
+    a time, so ``items`` may be a streaming cursor.
+    """
+    page_width, page_height = page_size
+    margin = 36
+    line_height = 16
+    footer_height = 30
+    totals_height = 4 * line_height + 15
+    right = page_width - margin
+    qty_x, price_x = page_width * 0.58, page_width * 0.76
+    name_chars = int((qty_x - margin - 50) / 5.5)
+    page_number = 1
+    running_subtotal = 0
+
+    def draw_table_header(y):
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(margin, y, "Item")
+        c.drawRightString(qty_x, y, "Qty")
+        c.drawRightString(price_x, y, "Price")
+        c.drawRightString(right, y, "Total")
+        c.setFont("Helvetica", 10)
+        return y - line_height
+
+    def finish_page(carry):
+        if carry:
+            c.setFont("Helvetica-Bold", 10)
+            c.drawRightString(price_x, margin + 4, "Carried forward:")
+            c.drawRightString(right, margin + 4, f"{running_subtotal:.2f}")
+        c.setFont("Helvetica", 8)
+        c.drawString(margin, margin - 16, f"Invoice #{invoice.id}")
+        c.drawRightString(right, margin - 16, f"Page {page_number}")
+        c.showPage()
+
+    c.setPageSize(page_size)
+    y = draw_table_header(draw_pdf_heading(c, invoice, margin, page_height - margin))
+
+    # --- Items ---
+    for name, qty, price in items:
+        if y < margin + footer_height:
+            finish_page(carry=True)
+            page_number += 1
+            y = page_height - margin
+            c.setFont("Helvetica-Bold", 10)
+            c.drawString(margin, y, f"Invoice #{invoice.id} (continued)")
+            y = draw_table_header(y - 25)
+            c.setFont("Helvetica-Bold", 10)
+            c.drawRightString(price_x, y, "Brought forward:")
+            c.drawRightString(right, y, f"{running_subtotal:.2f}")
+            c.setFont("Helvetica", 10)
+            y -= line_height
+        c.drawString(margin, y, name[:name_chars])
+        c.drawRightString(qty_x, y, str(qty))
+        c.drawRightString(price_x, y, f"{price:.2f}")
+        c.drawRightString(right, y, f"{qty * price:.2f}")
+        running_subtotal += qty * price
+        y -= line_height
+
+    # --- Totals (moved to a fresh page when they do not fit) ---
+    if y - totals_height < margin + footer_height:
+        finish_page(carry=True)
+        page_number += 1
+        y = page_height - margin
+    subtotal, tax_amount, discount_amount, total = stored_invoice_totals(invoice)
+    y -= 15
+    c.setFont("Helvetica-Bold", 10)
+    for label, amount in (("Subtotal:", subtotal),
+                          (f"Tax ({invoice.tax_rate}%):", tax_amount),
+                          (f"Discount ({invoice.discount_rate}%):", discount_amount),
+                          ("Total:", total)):
+        c.drawRightString(price_x, y, label)
+        c.drawRightString(right, y, f"{amount:.2f}")
+        y -= line_height
+    finish_page(carry=False)
+
+def draw_invoice_pdf(c, invoice, items, layout=None, page_size=None):
+    """Draw an invoice with the given (name, qty, price) rows as the next page(s) of canvas ``c``.
+
+    ``layout`` and ``page_size`` default to the PDF_LAYOUT and PDF_PAGE_SIZE settings.
+    """
+    if (layout or current_app.config['PDF_LAYOUT']) == 'paged':
+        from reportlab.lib import pagesizes
+        draw_invoice_pdf_paged(c, invoice, items,
+                               getattr(pagesizes, page_size or current_app.config['PDF_PAGE_SIZE']))
+    else:
+        draw_invoice_pdf_dynamic(c, invoice, items)
+
+def render_invoice_pdf(invoice, items, layout=None, page_size=None):
+    """Render a single invoice and return the PDF bytes."""
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    draw_invoice_pdf(c, invoice, items, layout, page_size)
     c.save()
-    buffer.seek(0)
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=f"invoice_{invoice.id}.pdf",
-        mimetype='application/pdf'
-    )
-
-# --- Initialize DB and default user ---
-with app.app_context():
+    return buffer.getvalue()
+
+def pdf_content_key(invoice, items, layout, page_size):
+    """Cache key covering every value that is drawn on the PDF."""
+    return PDFCache.content_key({
+        'layout': [layout, page_size],
+        'invoice': [invoice.id, invoice.client_name, invoice.date_created,
+                    invoice.tax_rate, invoice.discount_rate],
+        'totals': stored_invoice_totals(invoice),
+        'items': [list(item) for item in items],
+        'company': COMPANY,
+    })
+
+@bp.route('/invoice/<int:invoice_id>/pdf')
+@login_required
+def export_pdf(invoice_id):
+    layout = request.args.get('layout', current_app.config['PDF_LAYOUT'])
+    page_size = request.args.get('size', current_app.config['PDF_PAGE_SIZE'])
+    if layout not in PDF_LAYOUTS or page_size not in PDF_PAGE_SIZES:
+        abort(400)
+    if layout == 'dynamic':
+        page_size = None
+    invoice = Invoice.query.get_or_404(invoice_id)
+
+    def build_response():
+        items = invoice_item_rows(invoice.id).all()
+        key = pdf_content_key(invoice, items, layout, page_size) if pdf_cache.enabled else None
+        pdf = pdf_cache.get(invoice.id, key) if key else None
+        if pdf is None:
+            with export_render_seconds.time(format='pdf'):
+                data = render_invoice_pdf(invoice, items, layout, page_size)
+            if key:
+                pdf_cache.put(invoice.id, key, data)
+            pdf = io.BytesIO(data)
+        return send_file(pdf, as_attachment=True,
+                         download_name=f"invoice_{invoice.id}.pdf",
+                         mimetype='application/pdf', etag=False, conditional=False)
+
+    kind = f"pdf-{layout}-{page_size}" if page_size else 'pdf'
+    return conditional_invoice_response(invoice, kind, build_response)
+
+# --- Batch PDF Export (ZIP or one combined PDF) ---
+BATCH_PDF_CHUNK = 25
+
+def load_invoices_with_items(invoice_ids):
+    """Load invoices and their (name, qty, price) rows in two queries, in the given order."""
+    invoices = {invoice.id: invoice for invoice in Invoice.query.filter(Invoice.id.in_(invoice_ids))}
+    items = defaultdict(list)
+    for invoice_id, name, qty, price in db.session.execute(
+            db.select(InvoiceItem.invoice_id, InvoiceItem.name, InvoiceItem.qty, InvoiceItem.price)
+            .where(InvoiceItem.invoice_id.in_(invoice_ids))
+            .order_by(InvoiceItem.id)):
+        items[invoice_id].append((name, qty, price))
+    return [(invoices[invoice_id], items[invoice_id]) for invoice_id in invoice_ids if invoice_id in invoices]
+
+def render_pdf_chunk(invoice_ids):
+    """Render a chunk of invoices to separate PDFs; runs inside a pool worker."""
+    with _worker_app.app_context():
+        return [(invoice.id, render_invoice_pdf(invoice, items))
+                for invoice, items in load_invoices_with_items(invoice_ids)]
+
+def render_combined_pdf(invoice_ids):
+    """Render all invoices as consecutive pages of one PDF; runs inside a pool worker."""
+    with _worker_app.app_context():
+        buffer = io.BytesIO()
+        from reportlab.pdfgen import canvas
+        c = canvas.Canvas(buffer)
+        for start in range(0, len(invoice_ids), BATCH_PDF_CHUNK):
+            for invoice, items in load_invoices_with_items(invoice_ids[start:start + BATCH_PDF_CHUNK]):
+                draw_invoice_pdf(c, invoice, items)
+            db.session.expunge_all()
+        c.save()
+        return buffer.getvalue()
+
+def write_batch_pdfs(executor, invoice_ids, output, fmt):
+    if fmt == 'pdf':
+        output.write(executor.submit(render_combined_pdf, invoice_ids).result())
+    else:
+        chunks = [invoice_ids[start:start + BATCH_PDF_CHUNK]
+                  for start in range(0, len(invoice_ids), BATCH_PDF_CHUNK)]
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for rendered in executor.map(render_pdf_chunk, chunks):
+                for invoice_id, pdf in rendered:
+                    archive.writestr(f"invoice_{invoice_id}.pdf", pdf)
+
+def batch_render_pdfs(criteria, output, fmt='zip'):
+    """Render every invoice matching ``criteria`` into ``output``.
+
+    ``zip`` spreads chunks of invoices over the export process pool and adds
+    one PDF per invoice to the archive as chunks complete. ``pdf`` draws a
+    single document with one invoice after another; ReportLab cannot merge
+    separately rendered files, so that document is drawn by one worker.
+    Returns (invoice count, seconds elapsed).
+    """
+    started = time.perf_counter()
+    invoice_ids = [invoice_id for invoice_id, in db.session.query(Invoice.id).filter(*criteria)
+                   .order_by(Invoice.date_created, Invoice.id)]
+    offset = output.tell()
+    for attempt in range(2):
+        executor = get_export_executor()
+        try:
+            write_batch_pdfs(executor, invoice_ids, output, fmt)
+            break
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start over once on a fresh pool.
+            if attempt:
+                raise
+            replace_broken_executor(executor)
+            output.seek(offset)
+            output.truncate()
+    elapsed = time.perf_counter() - started
+    logging.info(f"Batch PDF ({fmt}): {len(invoice_ids)} invoice(s) in {elapsed:.2f}s "
+                 f"({len(invoice_ids) / elapsed:.1f} invoices/sec)")
+    return len(invoice_ids), elapsed
+
+@bp.route('/invoices/pdf')
+@login_required
+def export_invoices_pdf():
+    fmt = request.args.get('format', 'zip')
+    if fmt not in ('zip', 'pdf'):
+        abort(400)
+    criteria = invoice_selection(request.args)
+    if not criteria:
+        flash("Choose a date range, client or invoice IDs to export.", "danger")
+        return redirect(url_for('main.index'))
+    if db.session.query(Invoice.id).filter(*criteria).first() is None:
+        flash("No invoices match the selected range.", "danger")
+        return redirect(url_for('main.index'))
+    output = tempfile.TemporaryFile()
+    count, elapsed = batch_render_pdfs(criteria, output, fmt)
+    output.seek(0)
+    response = send_file(output, as_attachment=True,
+                         download_name=f"invoices.{fmt}",
+                         mimetype='application/zip' if fmt == 'zip' else 'application/pdf')
+    response.headers['X-Invoices-Rendered'] = str(count)
+    response.headers['X-Render-Throughput'] = f"{count / elapsed:.1f} invoices/sec"
+    return response
+
+def check_selection_option(ctx, param, value):
+    """Click callback: reject what invoice_selection() would answer with a 400."""
+    if value:
+        try:
+            invoice_selection(MultiDict({param.name: value}))
+        except HTTPException:
+            raise click.BadParameter(f"expected {param.metavar}, got {value!r}.")
+    return value
+
+@bp.cli.command('export-pdfs')
+@click.option('--client', help="Exact client name.")
+@click.option('--start', metavar='YYYY-MM-DD', callback=check_selection_option, help="First day, inclusive.")
+@click.option('--end', metavar='YYYY-MM-DD', callback=check_selection_option, help="Last day, inclusive.")
+@click.option('--ids', metavar='ID[,ID...]', callback=check_selection_option, help="Comma-separated invoice IDs.")
+@click.option('--format', 'fmt', type=click.Choice(['zip', 'pdf']), default='zip')
+@click.option('--output', type=click.Path(dir_okay=False), required=True)
+def export_pdfs_command(client, start, end, ids, fmt, output):
+    """Render a selection of invoices to a ZIP of PDFs or one combined PDF."""
+    criteria = invoice_selection(MultiDict({key: value for key, value in
+                                            {'client': client, 'start': start, 'end': end, 'ids': ids}.items()
+                                            if value}))
+    if not criteria:
+        raise click.UsageError("Give at least one of --client, --start, --end or --ids.")
+    with open(output, 'wb') as f:
+        count, elapsed = batch_render_pdfs(criteria, f, fmt)
+    click.echo(f"Rendered {count} invoice(s) to {output} in {elapsed:.2f}s "
+               f"({count / elapsed:.1f} invoices/sec).")
+
+@bp.route('/pdf-cache/stats')
+@login_required
+def pdf_cache_stats():
+    return jsonify(pdf_cache.stats())
+
+# --- Background Export Jobs ---
+EXPORT_FORMATS = {
+    'pdf': ('application/pdf',
+            lambda invoice, output: output.write(render_invoice_pdf(invoice, invoice_item_rows(invoice.id).all()))),
+    'xlsx': (XLSX_MIMETYPE, write_invoice_xlsx),
+}
+EXPORT_SWEEP_INTERVAL = 3600  # seconds between opportunistic sweeps, per server process
+_export_executor = None
+_export_executor_lock = threading.Lock()
+_worker_app = None
+_last_export_sweep = None
+
+def _init_export_worker(log_queue, config):
+    # Each worker builds its own app (and so its own engine and connections)
+    # from the parent app's config, then logs through the parent's queue.
+    global _worker_app
+    _worker_app = create_app(config)
+    logging_setup.attach_worker(log_queue, config['LOG_LEVEL'])
+
+def get_export_executor():
+    """Process pool shared by all export jobs of this server process.
+
+    Workers are spawned rather than forked: a fork from a threaded server
+    copies whatever locks other threads held at that moment.
+    """
+    global _export_executor
+    with _export_executor_lock:
+        if _export_executor is None:
+            _export_executor = ProcessPoolExecutor(max_workers=current_app.config['EXPORT_WORKERS'],
+                                                   mp_context=multiprocessing.get_context('spawn'),
+                                                   initializer=_init_export_worker,
+                                                   initargs=(logging_setup.log_queue, dict(current_app.config)))
+        return _export_executor
+
+def replace_broken_executor(executor):
+    """Drop a pool broken by a dead worker; the next get_export_executor() starts a new one."""
+    global _export_executor
+    with _export_executor_lock:
+        if _export_executor is executor:
+            _export_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+    logging.warning("Export worker pool broken by a dead worker process; replacing it")
+
+def submit_export_task(fn, *args):
+    executor = get_export_executor()
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        replace_broken_executor(executor)
+        return get_export_executor().submit(fn, *args)
+
+def queue_export_job(job_id, retries=1):
+    """Hand a job to the pool; if its worker dies, resubmit up to ``retries`` times."""
+    app = current_app._get_current_object()
+    future = submit_export_task(run_export_job, job_id)
+    future.add_done_callback(lambda future: _export_job_done(app, job_id, retries, future))
+
+def _export_job_done(app, job_id, retries, future):
+    # run_export_job records its own errors, so this only acts when the worker was lost.
+    if not future.cancelled() and future.exception() is None:
+        return
+    with app.app_context():
+        if retries:
+            logging.warning("Export job %s lost its worker; resubmitting", job_id)
+            try:
+                queue_export_job(job_id, retries - 1)
+                return
+            except Exception:
+                logging.exception("Could not resubmit export job %s", job_id)
+        fail_export_job(job_id, "The export worker stopped before finishing the job")
+
+def fail_export_job(job_id, error):
+    job = db.session.get(ExportJob, job_id)
+    if job is not None and job.status in ('queued', 'running'):
+        job.status, job.error, job.finished_at = 'failed', error, datetime.utcnow()
+        db.session.commit()
+
+def fail_interrupted_export_jobs():
+    """Fail jobs still queued or running from before a restart; no pool will finish them."""
+    count = (ExportJob.query.filter(ExportJob.status.in_(('queued', 'running')))
+             .update({'status': 'failed', 'error': "Interrupted by a server restart",
+                      'finished_at': datetime.utcnow()}, synchronize_session=False))
+    db.session.commit()
+    if count:
+        logging.warning(f"Marked {count} interrupted export job(s) as failed")
+    return count
+
+def sweep_exports():
+    """Delete export jobs and files older than EXPORT_RETENTION_HOURS.
+
+    Rows go by creation time, whatever their status: a job still queued or
+    running that long ago has lost its worker. Files go by modification
+    time, which also catches leftover ``.part`` files. Returns (jobs, files).
+    """
+    hours = current_app.config['EXPORT_RETENTION_HOURS']
+    jobs = (ExportJob.query.filter(ExportJob.created_at < datetime.utcnow() - timedelta(hours=hours))
+            .delete(synchronize_session=False))
+    db.session.commit()
+    files, cutoff = 0, time.time() - hours * 3600
+    try:
+        entries = list(os.scandir(current_app.config['EXPORT_DIR']))
+    except FileNotFoundError:
+        entries = []
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                files += 1
+        except FileNotFoundError:
+            pass
+    return jobs, files
+
+def maybe_sweep_exports():
+    """Run sweep_exports() at most every EXPORT_SWEEP_INTERVAL seconds in this process."""
+    global _last_export_sweep
+    now = time.monotonic()
+    if _last_export_sweep is not None and now - _last_export_sweep < EXPORT_SWEEP_INTERVAL:
+        return
+    _last_export_sweep = now
+    try:
+        jobs, files = sweep_exports()
+    except Exception:
+        db.session.rollback()
+        logging.exception("Export sweep failed")
+        return
+    if jobs or files:
+        logging.info(f"Export sweep removed {jobs} job(s) and {files} file(s)")
+
+def export_job_path(job):
+    return os.path.join(current_app.config['EXPORT_DIR'], f"{job.id}.{job.format}")
+
+def run_export_job(job_id):
+    """Render one queued export to EXPORT_DIR; runs inside a pool worker."""
+    with _worker_app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        job.status = 'running'
+        db.session.commit()
+        try:
+            invoice = db.session.get(Invoice, job.invoice_id)
+            if invoice is None:
+                raise LookupError(f"Invoice {job.invoice_id} no longer exists")
+            os.makedirs(current_app.config['EXPORT_DIR'], exist_ok=True)
+            path = export_job_path(job)
+            with open(path + '.part', 'wb') as output:
+                EXPORT_FORMATS[job.format][1](invoice, output)
+            os.replace(path + '.part', path)
+            job.status = 'done'
+        except Exception as exc:
+            db.session.rollback()
+            logging.exception("Export job %s failed", job_id)
+            job.status = 'failed'
+            job.error = str(exc)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+def export_job_json(job):
+    return {
+        'id': job.id,
+        'invoice_id': job.invoice_id,
+        'format': job.format,
+        'status': job.status,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': url_for('main.export_job_status', job_id=job.id),
+        'download_url': url_for('main.export_job_download', job_id=job.id) if job.status == 'done' else None,
+    }
+
+@bp.route('/invoice/<int:invoice_id>/export/<fmt>', methods=['POST'])
+@login_required
+def submit_export_job(invoice_id, fmt):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    invoice = Invoice.query.get_or_404(invoice_id)
+    maybe_sweep_exports()
+    job = ExportJob(id=uuid.uuid4().hex, invoice_id=invoice.id, format=fmt)
+    db.session.add(job)
+    db.session.commit()
+    try:
+        queue_export_job(job.id)
+    except Exception as exc:
+        logging.exception("Could not queue export job %s", job.id)
+        fail_export_job(job.id, f"Could not start the export: {exc}")
+        response = jsonify(export_job_json(job))
+        response.status_code = 503
+        return response
+    logging.info(f"Export job {job.id} queued: invoice {invoice.id} as {fmt}")
+    response = jsonify(export_job_json(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('main.export_job_status', job_id=job.id)
+    return response
+
+@bp.route('/exports/<job_id>')
+@login_required
+def export_job_status(job_id):
+    job = db.get_or_404(ExportJob, job_id)
+    return jsonify(export_job_json(job))
+
+@bp.route('/exports/<job_id>/download')
+@login_required
+def export_job_download(job_id):
+    job = db.get_or_404(ExportJob, job_id)
+    if job.status != 'done':
+        response = jsonify(export_job_json(job))
+        response.status_code = 409
+        return response
+    return send_file(export_job_path(job), as_attachment=True,
+                     download_name=f"invoice_{job.invoice_id}.{job.format}",
+                     mimetype=EXPORT_FORMATS[job.format][0])
+
+# --- Reports: revenue, tax and discount by day / month / client ---
+REPORT_GROUPS = ('day', 'month', 'client')
+
+def period_key(column, group):
+    """SQL expression formatting a date/datetime column as YYYY-MM-DD or YYYY-MM."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return db.func.to_char(column, 'YYYY-MM-DD' if group == 'day' else 'YYYY-MM')
+    if dialect in ('mysql', 'mariadb'):
+        return db.func.date_format(column, '%Y-%m-%d' if group == 'day' else '%Y-%m')
+    return db.func.strftime('%Y-%m-%d' if group == 'day' else '%Y-%m', column)
+
+ROLLUP_SUMS = ('invoice_count', 'subtotal', 'tax_amount', 'discount_amount', 'total')
+
+def rollup_entry(invoice):
+    """An invoice's share of its rollup row: (day, client_name, (count, subtotal, tax, discount, total))."""
+    return invoice.date_created.date(), invoice.client_name, (1,) + stored_invoice_totals(invoice)
+
+def rollup_upsert(values):
+    """INSERT the rollup row, or add ``values`` to the sums of the existing one."""
+    if db.engine.dialect.name in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(DailyRevenue).values(values)
+        return stmt.on_duplicate_key_update({name: DailyRevenue.__table__.c[name] + stmt.inserted[name]
+                                             for name in ROLLUP_SUMS})
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(DailyRevenue).values(values)
+    return stmt.on_conflict_do_update(index_elements=['day', 'client_name'],
+                                      set_={name: DailyRevenue.__table__.c[name] + stmt.excluded[name]
+                                            for name in ROLLUP_SUMS})
+
+def update_daily_revenue(removed=(), added=()):
+    """Apply invoice changes to the rollup as deltas; entries come from rollup_entry().
+
+    Called in the same transaction as the invoice write. Each affected row
+    gets one atomic upsert that adds the delta to its sums, so concurrent
+    writers to the same day and client wait on the row lock instead of
+    racing a delete and re-insert into a duplicate key. Rows are visited
+    in key order, so two writers always lock them in the same order.
+    """
+    if not current_app.config['REPORTS_USE_ROLLUP']:
+        return
+    deltas = defaultdict(lambda: [0] * len(ROLLUP_SUMS))
+    for sign, entries in ((-1, removed), (1, added)):
+        for day, client_name, sums in entries:
+            delta = deltas[day, client_name]
+            for n, value in enumerate(sums):
+                delta[n] += sign * value
+    for (day, client_name), delta in sorted(deltas.items()):
+        if not any(delta):
+            continue  # e.g. an edit that changed neither the key nor the totals
+        db.session.execute(rollup_upsert(dict(zip(ROLLUP_SUMS, delta), day=day, client_name=client_name)))
+        if delta[0] < 0:
+            db.session.execute(db.delete(DailyRevenue).where(DailyRevenue.day == day,
+                                                             DailyRevenue.client_name == client_name,
+                                                             DailyRevenue.invoice_count <= 0))
+
+def rebuild_daily_revenue():
+    """Recompute the whole rollup table with one INSERT ... SELECT."""
+    DailyRevenue.query.delete()
+    day = db.func.date(Invoice.date_created)
+    db.session.execute(db.insert(DailyRevenue).from_select(
+        ['day', 'client_name', 'invoice_count', 'subtotal', 'tax_amount', 'discount_amount', 'total'],
+        db.select(day, Invoice.client_name, db.func.count(Invoice.id),
+                  db.func.sum(Invoice.subtotal), db.func.sum(Invoice.tax_amount),
+                  db.func.sum(Invoice.discount_amount), db.func.sum(Invoice.total))
+        .group_by(day, Invoice.client_name)))
+    db.session.commit()
+
+@bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Rebuild the daily revenue rollup table from all invoices."""
+    rebuild_daily_revenue()
+    click.echo(f"Rebuilt {DailyRevenue.query.count()} daily rollup row(s).")
+
+def revenue_report(group, start=None, end=None, client=None):
+    """Aggregate invoices by period or client, entirely in SQL.
+
+    Reads the daily rollup when REPORTS_USE_ROLLUP is on (a handful of rows
+    per day) and falls back to aggregating the invoice table otherwise.
+    ``start``/``end`` are inclusive dates.
+    """
+    if current_app.config['REPORTS_USE_ROLLUP']:
+        source, day_column = DailyRevenue, DailyRevenue.day
+        invoice_count = db.func.sum(DailyRevenue.invoice_count)
+        bounds = [day_column >= start.date()] if start else []
+        bounds += [day_column <= end.date()] if end else []
+    else:
+        source, day_column = Invoice, Invoice.date_created
+        invoice_count = db.func.count(Invoice.id)
+        bounds = [day_column >= start] if start else []
+        bounds += [day_column < end + timedelta(days=1)] if end else []
+    if client:
+        bounds.append(source.client_name == client)
+
+    key = source.client_name if group == 'client' else period_key(day_column, group)
+    total = db.func.sum(source.total)
+    query = (db.session.query(key.label('key'),
+                              invoice_count.label('invoices'),
+                              db.func.sum(source.subtotal).label('subtotal'),
+                              db.func.sum(source.tax_amount).label('tax'),
+                              db.func.sum(source.discount_amount).label('discount'),
+                              total.label('revenue'))
+             .filter(*bounds)
+             .group_by(key))
+    return query.order_by(total.desc() if group == 'client' else key).all()
+
+@bp.route('/reports')
+@login_required
+def reports():
+    group = request.args.get('group', 'month')
+    if group not in REPORT_GROUPS:
+        abort(400)
+    start = parse_date_arg(request.args['start']) if request.args.get('start') else None
+    end = parse_date_arg(request.args['end']) if request.args.get('end') else None
+    client = request.args.get('client', '').strip() or None
+    rows = revenue_report(group, start, end, client)
+    if request.args.get('format') == 'json':
+        return jsonify([row._asdict() for row in rows])
+    return render_template('reports.html', rows=rows, group=group)
+
+# --- Search: SQLite FTS5 / PostgreSQL tsvector index over clients and items ---
+def search_backend():
+    dialect = db.engine.dialect.name
+    return dialect if dialect in ('sqlite', 'postgresql') else None
+
+def create_search_index():
+    """Create the search table if missing; return True when it was just created."""
+    backend = search_backend()
+    if backend is None or db.inspect(db.engine).has_table('invoice_search'):
+        return False
+    if backend == 'sqlite':
+        # One document per invoice (rowid = invoice.id); prefix indexes speed up "term*" queries.
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE invoice_search USING fts5("
+            "client_name, item_names, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"))
+    else:
+        db.session.execute(db.text(
+            "CREATE TABLE invoice_search ("
+            "invoice_id INTEGER PRIMARY KEY REFERENCES invoice(id) ON DELETE CASCADE, "
+            "document TSVECTOR NOT NULL)"))
+        db.session.execute(db.text(
+            "CREATE INDEX ix_invoice_search_document ON invoice_search USING GIN (document)"))
+    db.session.commit()
+    return True
+
+def _search_document_select(where):
+    if search_backend() == 'sqlite':
+        return ("INSERT INTO invoice_search (rowid, client_name, item_names) "
+                "SELECT invoice.id, invoice.client_name, coalesce(group_concat(invoice_item.name, ' '), '') "
+                "FROM invoice LEFT JOIN invoice_item ON invoice_item.invoice_id = invoice.id "
+                f"{where} GROUP BY invoice.id, invoice.client_name")
+    return ("INSERT INTO invoice_search (invoice_id, document) "
+            "SELECT invoice.id, setweight(to_tsvector('simple', invoice.client_name), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(string_agg(invoice_item.name, ' '), '')), 'B') "
+            "FROM invoice LEFT JOIN invoice_item ON invoice_item.invoice_id = invoice.id "
+            f"{where} GROUP BY invoice.id, invoice.client_name")
+
+def reindex_invoice_for_search(invoice_id, deleted=False):
+    """Refresh one invoice's search document inside the current transaction."""
+    backend = search_backend()
+    if backend is None:
+        return
+    db.session.flush()
+    key = 'rowid' if backend == 'sqlite' else 'invoice_id'
+    db.session.execute(db.text(f"DELETE FROM invoice_search WHERE {key} = :id"), {'id': invoice_id})
+    if not deleted:
+        db.session.execute(db.text(_search_document_select("WHERE invoice.id = :id")), {'id': invoice_id})
+
+def rebuild_search_index():
+    if search_backend() is None:
+        return
+    db.session.execute(db.text("DELETE FROM invoice_search"))
+    db.session.execute(db.text(_search_document_select("")))
+    db.session.commit()
+
+@bp.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text search index from all invoices."""
+    rebuild_search_index()
+    click.echo("Search index rebuilt.")
+
+def search_invoices(query, limit=50):
+    """Invoices whose client or item names match every word of ``query`` as a prefix, best first."""
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return []
+    columns = "invoice.id, invoice.client_name, invoice.date_created, invoice.total"
+    backend = search_backend()
+    if backend == 'sqlite':
+        sql = (f"SELECT {columns} FROM invoice_search JOIN invoice ON invoice.id = invoice_search.rowid "
+               "WHERE invoice_search MATCH :match "
+               "ORDER BY bm25(invoice_search, 10.0, 1.0) LIMIT :limit")
+        params = {'match': ' '.join(f'"{term}"*' for term in terms)}
+    elif backend == 'postgresql':
+        sql = (f"SELECT {columns} FROM invoice_search JOIN invoice ON invoice.id = invoice_search.invoice_id "
+               "WHERE invoice_search.document @@ to_tsquery('simple', :match) "
+               "ORDER BY ts_rank(invoice_search.document, to_tsquery('simple', :match)) DESC LIMIT :limit")
+        params = {'match': ' & '.join(f"{term}:*" for term in terms)}
+    else:
+        conditions = []
+        params = {}
+        for n, term in enumerate(terms):
+            params[f'term{n}'] = f"%{term}%"
+            conditions.append(f"(invoice.client_name LIKE :term{n} OR EXISTS (SELECT 1 FROM invoice_item "
+                              f"WHERE invoice_item.invoice_id = invoice.id AND invoice_item.name LIKE :term{n}))")
+        sql = (f"SELECT {columns} FROM invoice WHERE {' AND '.join(conditions)} "
+               "ORDER BY invoice.date_created DESC LIMIT :limit")
+    params['limit'] = limit
+    return db.session.execute(db.text(sql).columns(Invoice.id, Invoice.client_name,
+                                                   Invoice.date_created, Invoice.total), params).all()
+
+@bp.route('/search')
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    return render_template('search.html', query=query, results=search_invoices(query) if query else [])
+
+# --- Connection Pool Stats ---
+pool_events = {'connect': 0, 'checkout': 0, 'checkin': 0, 'invalidate': 0}
+
+def count_pool_event(name):
+    def listener(*args):
+        pool_events[name] += 1
+    return listener
+
+@bp.route('/pool-stats')
+@login_required
+def pool_stats():
+    pool = db.engine.pool
+    stats = {'pool': type(pool).__name__, 'status': pool.status(), 'events': pool_events}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return jsonify(stats)
+
+# --- Schema Migrations ---
+# Versioned, forward-only steps that bring an existing database up to the
+# current models without rebuilding it. db.create_all() creates missing
+# tables; everything it cannot do on a table that already exists (new
+# columns, new indexes, backfills, non-model tables) is a migration here.
+# Steps are idempotent, so databases upgraded by earlier ad-hoc code can
+# safely replay them. Append new steps with the next version number.
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+def add_column(model, name):
+    """ALTER TABLE ... ADD COLUMN for a model column, unless it already exists."""
+    table = model.__table__
+    if name in {column['name'] for column in db.inspect(db.engine).get_columns(table.name)}:
+        return
+    column_type = table.columns[name].type.compile(dialect=db.engine.dialect)
+    db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {name} {column_type}'))
+
+def create_index(model, name):
+    next(index for index in model.__table__.indexes if index.name == name).create(db.engine, checkfirst=True)
+
+@migration(1, "Keyset pagination index on invoice (date_created, id)")
+def _add_invoice_pagination_index():
+    create_index(Invoice, 'ix_invoice_date_created_id')
+
+@migration(2, "Stored totals and updated_at on invoice")
+def _add_invoice_totals_and_updated_at():
+    for name in ('subtotal', 'tax_amount', 'discount_amount', 'total', 'updated_at'):
+        add_column(Invoice, name)
+    db.session.execute(db.update(Invoice).where(Invoice.updated_at.is_(None))
+                       .values(updated_at=Invoice.date_created))
+    db.session.commit()
+    backfill_invoice_totals()
+
+@migration(3, "Fill the daily revenue rollup")
+def _fill_daily_revenue():
+    if current_app.config['REPORTS_USE_ROLLUP']:
+        rebuild_daily_revenue()
+
+@migration(4, "Full-text search index")
+def _add_search_index():
+    create_search_index()
+    rebuild_search_index()
+
+@migration(5, "Indexes on invoice_item.invoice_id and invoice.client_name")
+def _add_foreign_key_and_client_indexes():
+    create_index(InvoiceItem, 'ix_invoice_item_invoice_id')
+    create_index(Invoice, 'ix_invoice_client_name')
+
+def alter_column_type(model, name):
+    """Change an existing column to the model's type (a no-op on SQLite, whose columns are untyped)."""
+    table, dialect = model.__table__, db.engine.dialect
+    column = table.columns[name]
+    column_type = column.type.compile(dialect=dialect)
+    if dialect.name == 'postgresql':
+        db.session.execute(db.text(f'ALTER TABLE {table.name} ALTER COLUMN {name} TYPE {column_type}'))
+    elif dialect.name in ('mysql', 'mariadb'):
+        null = 'NULL' if column.nullable else 'NOT NULL'
+        db.session.execute(db.text(f'ALTER TABLE {table.name} MODIFY {name} {column_type} {null}'))
+
+@migration(6, "Exact NUMERIC money and rate columns, totals recomputed to the cent")
+def _use_numeric_money_columns():
+    money_columns = ('subtotal', 'tax_amount', 'discount_amount', 'total')
+    for model, names in ((Invoice, ('tax_rate', 'discount_rate') + money_columns),
+                         (InvoiceItem, ('price',)),
+                         (DailyRevenue, money_columns)):
+        for name in names:
+            alter_column_type(model, name)
+    db.session.commit()
+    backfill_invoice_totals()
+    if current_app.config['REPORTS_USE_ROLLUP']:
+        rebuild_daily_revenue()
+
+def schema_version():
+    """Last migration applied; 0 for databases from before migrations were tracked."""
+    if not db.inspect(db.engine).has_table(SchemaVersion.__tablename__):
+        return 0
+    row = db.session.get(SchemaVersion, 1)
+    return row.version if row else 0
+
+def migrate_database():
+    """Create missing tables, then apply pending migrations in order; return the versions applied."""
     db.create_all()
+    current = schema_version()
+    applied = []
+    for version, description, fn in sorted(MIGRATIONS, key=lambda step: step[0]):
+        if version <= current:
+            continue
+        fn()
+        row = db.session.get(SchemaVersion, 1) or SchemaVersion(id=1)
+        row.version = version
+        db.session.add(row)
+        db.session.commit()
+        logging.info(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    applied = migrate_database()
+    click.echo(f"Applied migration(s) {', '.join(map(str, applied))}." if applied
+               else "Database is up to date.")
+    click.echo(f"Schema version: {schema_version()}")
+
+@bp.cli.command('db-version')
+def db_version_command():
+    """Show the database schema version and any pending migrations."""
+    current = schema_version()
+    click.echo(f"Schema version: {current}")
+    for version, description, _ in sorted(MIGRATIONS, key=lambda step: step[0]):
+        if version > current:
+            click.echo(f"  pending {version}: {description}")
+
+# --- Database Setup and Default User ---
+def init_db():
+    """Bring the schema up to date and make sure the default user exists.
+
+    Run it before starting the servers: export jobs left queued or running
+    by the previous ones are marked failed, as nothing will finish them.
+    """
+    migrate_database()
+    fail_interrupted_export_jobs()
     if not User.query.filter_by(username="IhArmayau").first():
         hashed = bcrypt.generate_password_hash("H4b!b0Ar").decode('utf-8')
         user = User(username="IhArmayau", password_hash=hashed)
@@ -286,6 +1669,81 @@ with app.app_context():
         db.session.commit()
         logging.info("Default user created.")
 
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create or upgrade the database schema and seed the default user."""
+    init_db()
+    click.echo(f"Database ready at schema version {schema_version()}.")
+
+@bp.cli.command('sweep-exports')
+def sweep_exports_command():
+    """Delete export jobs and files older than EXPORT_RETENTION_HOURS."""
+    jobs, files = sweep_exports()
+    click.echo(f"Removed {jobs} export job(s) and {files} file(s).")
+
+@bp.cli.command('rotate-secret-key')
+@click.option('--keep', default=1, show_default=True, help="Number of previous keys still accepted.")
+def rotate_secret_key_command(keep):
+    """Sign new sessions with a fresh key; older keys stay valid as fallbacks."""
+    path = current_app.config['SECRET_KEY_FILE']
+    keys = read_secret_keys(path) if os.path.exists(path) else []
+    write_secret_keys(path, [secrets.token_hex(32)] + keys[:keep])
+    click.echo(f"Wrote a new secret key to {path}, keeping {min(keep, len(keys))} previous key(s).")
+    click.echo("Copy the file to every node and restart the workers to start using it.")
+    if os.environ.get("SECRET_KEY"):
+        click.echo("Warning: SECRET_KEY is set in the environment and takes precedence over the file.")
+
+# --- Application Factory ---
+def register_engine_listeners():
+    """Per-connection setup, pool counters and SQL timing; creating the engine does not connect."""
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect',
+                     sqlite_pragma_listener(SQLITE_PROFILES[current_app.config['SQLITE_PROFILE']]))
+    elif current_app.config['DB_STATEMENT_TIMEOUT']:
+        event.listen(db.engine, 'connect',
+                     statement_timeout_listener(db.engine.dialect.name, current_app.config['DB_STATEMENT_TIMEOUT']))
+    for name in pool_events:
+        event.listen(db.engine, name, count_pool_event(name))
+    event.listen(db.engine, 'before_cursor_execute', start_sql_timer)
+    event.listen(db.engine, 'after_cursor_execute', stop_sql_timer)
+
+def create_app(config=None):
+    """Build a configured app; ``config`` overrides the environment settings.
+
+    Nothing here touches the database, so importing the module and booting a
+    worker stay cheap. Run ``flask --app app init-db`` (or start the app with
+    ``python app.py``) to create or upgrade the schema and seed the default user.
+    """
+    app = Flask(__name__)
+    load_config(app)
+    app.config.update(config or {})
+    # After the overrides, so a SECRET_KEY_FILE passed in config is the one used.
+    if not app.config.get('SECRET_KEY'):
+        app.config['SECRET_KEY'], app.config['SECRET_KEY_FALLBACKS'] = load_secret_keys(app.config['SECRET_KEY_FILE'])
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', server_engine_options())
+    db.init_app(app)
+    bcrypt.init_app(app)
+
+    # JSON lines written by a background listener thread; see logging_setup.
+    logging_setup.configure_logging(app.config['LOG_FILE'], level=app.config['LOG_LEVEL'],
+                                    max_bytes=app.config['LOG_MAX_BYTES'],
+                                    backup_count=app.config['LOG_BACKUP_COUNT'],
+                                    when=app.config['LOG_ROTATE_WHEN'])
+    # The request log replaces the development server's access lines.
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    app.jinja_env.globals.update(COMPANY=COMPANY, datetime=datetime)
+    app.extensions['pdf_cache'] = PDFCache(app.config['PDF_CACHE_DIR'], app.config['PDF_CACHE_MAX_BYTES'])
+    app.register_blueprint(bp)
+    with app.app_context():
+        register_engine_listeners()
+    return app
+
 # --- Run App ---
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # export workers in the packaged EXE
+    app = create_app()
+    with app.app_context():
+        init_db()
     app.run(debug=True)
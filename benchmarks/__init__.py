@@ -0,0 +1,13 @@
+"""Performance benchmarks for the invoice app.
+
+    python -m benchmarks.run             route latency/throughput and query counts, saved as JSON
+    python -m benchmarks.run --compare benchmarks/results/<old>.json
+    python -m benchmarks.loadtest        concurrent users against waitress
+    python benchmarks/bench_startup.py   cold start of a worker process
+    python benchmarks/bench_item_insert.py
+    python benchmarks/bench_sqlite_profile.py
+
+Everything runs against throwaway databases and directories under the
+system temp dir; nothing touches instance/ or the working tree except the
+JSON results written by the runner.
+"""
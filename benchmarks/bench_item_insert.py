@@ -0,0 +1,80 @@
+"""Benchmark invoice creation: per-object ORM inserts vs the bulk insert path.
+
+The "legacy" path mirrors the original new_invoice(): commit the invoice,
+add each InvoiceItem individually, then commit again. The "bulk" path is
+what new_invoice() does now: one transaction with a single executemany for
+the items.
+
+Usage:
+    python benchmarks/bench_item_insert.py [--lines 10 100 1000] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_items(count):
+    return [{'name': f"Item {n}", 'qty': n % 7 + 1, 'price': 1.25 + n} for n in range(count)]
+
+
+def legacy_create(appmod, items):
+    db, Invoice, InvoiceItem = appmod.db, appmod.Invoice, appmod.InvoiceItem
+    invoice = Invoice(client_name="Bench Client", tax_rate=7.5, discount_rate=2.0)
+    db.session.add(invoice)
+    db.session.commit()
+    for item in items:
+        db.session.add(InvoiceItem(invoice_id=invoice.id, **item))
+    db.session.commit()
+
+
+def bulk_create(appmod, items):
+    db, Invoice = appmod.db, appmod.Invoice
+    invoice = Invoice(client_name="Bench Client", tax_rate=7.5, discount_rate=2.0)
+    appmod.store_invoice_totals(invoice, ((item['qty'], item['price']) for item in items))
+    db.session.add(invoice)
+    db.session.flush()
+    appmod.insert_invoice_items(invoice.id, items)
+    db.session.commit()
+
+
+def time_path(appmod, create, items, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        create(appmod, items)
+        timings.append(time.perf_counter() - start)
+        appmod.db.session.expunge_all()
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='invoice-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['LOG_FILE'] = os.path.join(workdir, 'app.log')
+    os.environ['SECRET_KEY_FILE'] = os.path.join(workdir, 'secret_key')
+    sys.path.insert(0, ROOT)
+    import app as appmod
+
+    print(f"{'lines':>6} {'legacy ms':>10} {'bulk ms':>10} {'speedup':>8}")
+    app = appmod.create_app()
+    with app.app_context():
+        appmod.init_db()
+        for count in args.lines:
+            items = make_items(count)
+            legacy = time_path(appmod, legacy_create, items, args.repeat)
+            bulk = time_path(appmod, bulk_create, items, args.repeat)
+            print(f"{count:>6} {legacy * 1000:>10.2f} {bulk * 1000:>10.2f} {legacy / bulk:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark concurrent SQLite reads/writes under each SQLITE_PROFILES entry.
+
+Every profile gets a fresh database file seeded with invoices. Reader and
+writer processes (standing in for WSGI workers) then hammer it for a fixed
+time: readers run the invoice-list and item queries, writers create an
+invoice with a few items per transaction. Throughput and "database is
+locked" failures are reported per role.
+
+Usage:
+    python benchmarks/bench_sqlite_profile.py [--readers 4] [--writers 2] [--seconds 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='invoice-bench-')
+sys.path.insert(0, ROOT)
+
+import app as appmod  # noqa: E402
+from sqlalchemy import create_engine, event, select, insert, func  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+
+invoice_table = appmod.Invoice.__table__
+item_table = appmod.InvoiceItem.__table__
+
+
+def make_engine(path, profile):
+    # NullPool: one connection per operation, as short-lived worker requests see it.
+    engine = create_engine('sqlite:///' + path, poolclass=NullPool)
+    event.listen(engine, 'connect', appmod.sqlite_pragma_listener(appmod.SQLITE_PROFILES[profile]))
+    return engine
+
+
+def create_invoice(conn, rng):
+    invoice_id = conn.execute(insert(invoice_table).values(
+        client_name=f"Client {rng.randrange(200)}", tax_rate=7.5, discount_rate=0.0,
+        date_created=datetime.utcnow(), updated_at=datetime.utcnow(),
+        subtotal=0.0, tax_amount=0.0, discount_amount=0.0, total=0.0)).inserted_primary_key[0]
+    conn.execute(insert(item_table), [{'invoice_id': invoice_id, 'name': f"Item {n}",
+                                       'qty': rng.randrange(1, 10), 'price': rng.random() * 100}
+                                      for n in range(5)])
+
+
+def seed(path, profile, invoices):
+    engine = make_engine(path, profile)
+    appmod.db.metadata.create_all(engine, tables=[invoice_table, item_table])
+    rng = random.Random(0)
+    with engine.begin() as conn:
+        for _ in range(invoices):
+            create_invoice(conn, rng)
+    engine.dispose()
+
+
+def run_worker(path, profile, role, seconds, seed_value):
+    engine = make_engine(path, profile)
+    rng = random.Random(seed_value)
+    ops = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            if role == 'reader':
+                with engine.connect() as conn:
+                    rows = conn.execute(select(invoice_table.c.id, invoice_table.c.client_name,
+                                               invoice_table.c.total)
+                                        .order_by(invoice_table.c.date_created.desc(),
+                                                  invoice_table.c.id.desc())
+                                        .limit(50)).all()
+                    conn.execute(select(func.count()).select_from(item_table)
+                                 .where(item_table.c.invoice_id == rng.choice(rows).id)).scalar()
+            else:
+                with engine.begin() as conn:
+                    create_invoice(conn, rng)
+            ops += 1
+        except OperationalError:
+            errors += 1
+    engine.dispose()
+    return role, ops, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--seed-invoices', type=int, default=2000)
+    parser.add_argument('--profiles', nargs='+', default=list(appmod.SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'reads/s':>9} {'writes/s':>9} {'read errs':>10} {'write errs':>11}")
+    for profile in args.profiles:
+        path = os.path.join(WORKDIR, f"{profile}.db")
+        seed(path, profile, args.seed_invoices)
+        roles = ['reader'] * args.readers + ['writer'] * args.writers
+        totals = {'reader': [0, 0], 'writer': [0, 0]}
+        with ProcessPoolExecutor(max_workers=len(roles)) as pool:
+            futures = [pool.submit(run_worker, path, profile, role, args.seconds, n)
+                       for n, role in enumerate(roles)]
+            for future in futures:
+                role, ops, errors = future.result()
+                totals[role][0] += ops
+                totals[role][1] += errors
+        print(f"{profile:<12} {totals['reader'][0] / args.seconds:>9.0f} "
+              f"{totals['writer'][0] / args.seconds:>9.0f} "
+              f"{totals['reader'][1]:>10} {totals['writer'][1]:>11}")
+
+
+if __name__ == '__main__':
+    main()
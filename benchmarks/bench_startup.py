@@ -0,0 +1,125 @@
+"""Benchmark cold start: import, create_app and the first request in a fresh interpreter.
+
+Every run is a new Python process, as a WSGI worker boot or a packaged
+launch would be. Three cases are measured:
+
+    worker      import + create_app + first request (what a worker does now)
+    init-db     the same plus init_db() on an up-to-date database; this is
+                what every import used to do before the app factory
+    fresh-db    init_db() on an empty database: create tables, run every
+                migration and bcrypt-hash the default password
+
+Medians of each phase are printed in milliseconds, along with the process
+wall time including interpreter startup. Then ``python -X importtime`` is
+run on a worker boot and the slowest imports of app.py are listed, together
+with any of the export-only packages (openpyxl, reportlab) that got loaded.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ('import', 'create_app', 'init_db', 'first_request')
+EXPORT_ONLY = ('openpyxl', 'reportlab')
+
+CHILD = """
+import json, sys, time
+timings = {}
+started = time.perf_counter()
+import app as appmod
+timings['import'] = time.perf_counter() - started
+mark = time.perf_counter()
+application = appmod.create_app()
+timings['create_app'] = time.perf_counter() - mark
+if sys.argv[1] != 'worker':
+    mark = time.perf_counter()
+    with application.app_context():
+        appmod.init_db()
+    timings['init_db'] = time.perf_counter() - mark
+mark = time.perf_counter()
+response = application.test_client().get('/login')
+assert response.status_code == 200, response.status_code
+timings['first_request'] = time.perf_counter() - mark
+print(json.dumps(timings))
+"""
+
+
+def run_child(case, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, case], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode:
+        sys.exit(f"{case} run failed:\n{result.stderr}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings['process'] = wall
+    return timings
+
+
+def import_times(env):
+    """Return {module: (self_us, cumulative_us, depth)} for one worker boot under -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app; app.create_app()'],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(f"importtime run failed:\n{result.stderr}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='invoice-startup-')
+    base_env = dict(os.environ, LOG_FILE=os.path.join(workdir, 'app.log'),
+                    PDF_CACHE_DIR=os.path.join(workdir, 'pdf_cache'),
+                    EXPORT_DIR=os.path.join(workdir, 'exports'),
+                    SECRET_KEY_FILE=os.path.join(workdir, 'secret_key'))
+    ready_env = dict(base_env, DATABASE_URL='sqlite:///' + os.path.join(workdir, 'ready.db'))
+    run_child('init-db', ready_env)  # create the up-to-date database once
+
+    cases = {'worker': [], 'init-db': [], 'fresh-db': []}
+    for n in range(args.runs):
+        cases['worker'].append(run_child('worker', ready_env))
+        cases['init-db'].append(run_child('init-db', ready_env))
+        fresh_env = dict(base_env, DATABASE_URL='sqlite:///' + os.path.join(workdir, f'fresh{n}.db'))
+        cases['fresh-db'].append(run_child('fresh-db', fresh_env))
+
+    columns = PHASES + ('process',)
+    print(f"{'case':<10}" + ''.join(f"{name:>15}" for name in columns) + "   (median ms)")
+    for case, runs in cases.items():
+        cells = []
+        for name in columns:
+            values = [run[name] for run in runs if name in run]
+            cells.append(f"{statistics.median(values) * 1000:>15.1f}" if values else f"{'-':>15}")
+        print(f"{case:<10}" + ''.join(cells))
+
+    modules = import_times(ready_env)
+    # Depth 1 is what app.py itself imports; each time includes that module's own imports.
+    direct = sorted(((cumulative, name) for name, (_, cumulative, depth) in modules.items() if depth == 1),
+                    reverse=True)
+    print(f"\n-X importtime, worker boot: import app took {modules['app'][1] / 1000:.1f} ms; slowest imports:")
+    for cumulative, name in direct[:args.top]:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+    loaded = sorted({name.split('.')[0] for name in modules} & set(EXPORT_ONLY))
+    print(f"Export-only packages loaded at boot: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == '__main__':
+    main()
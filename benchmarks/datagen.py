@@ -0,0 +1,66 @@
+"""Deterministic synthetic invoice data for benchmarks.
+
+The same (invoices, items_per_invoice, clients, seed) always produces the
+same rows, so results from different commits are measured on identical
+data. Rows go in with executemany in chunks and the stored totals come
+from the app's own totals engine, so seeding 100k invoices takes seconds.
+"""
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from totals import totals_batch
+
+# Fixed, not "now": dates must not drift between runs.
+BASE_DATE = datetime(2025, 1, 1)
+CHUNK = 5000
+
+
+def invoice_rows(invoices, items_per_invoice, clients, seed=0):
+    """Yield (invoice, items) dicts; item counts vary by +/-50% around items_per_invoice."""
+    rng = random.Random(seed)
+    for invoice_id in range(1, invoices + 1):
+        created = BASE_DATE + timedelta(days=rng.randrange(365), seconds=rng.randrange(86400))
+        invoice = {
+            'id': invoice_id,
+            'client_name': f"Client {rng.randrange(clients):05d}",
+            'tax_rate': Decimal(rng.choice((0, 500, 750, 1000))).scaleb(-2),
+            'discount_rate': Decimal(rng.choice((0, 0, 0, 250, 500))).scaleb(-2),
+            'date_created': created,
+            'updated_at': created,
+        }
+        count = max(1, round(items_per_invoice * rng.uniform(0.5, 1.5))) if items_per_invoice else 0
+        items = [{'invoice_id': invoice_id,
+                  'name': f"Item {rng.randrange(10000):04d}",
+                  'qty': rng.randrange(1, 20),
+                  'price': Decimal(rng.randrange(100, 100000)).scaleb(-2)}
+                 for _ in range(count)]
+        yield invoice, items
+
+
+def _insert_chunk(appmod, invoices, items):
+    totals = totals_batch(((row['id'], row['tax_rate'], row['discount_rate']) for row in invoices),
+                          ((item['invoice_id'], item['qty'], item['price']) for item in items))
+    for row in invoices:
+        row['subtotal'], row['tax_amount'], row['discount_amount'], row['total'] = totals[row['id']]
+    appmod.db.session.execute(appmod.db.insert(appmod.Invoice), invoices)
+    if items:
+        appmod.db.session.execute(appmod.db.insert(appmod.InvoiceItem), items)
+
+
+def seed_database(appmod, invoices=1000, items_per_invoice=10, clients=100, seed=0):
+    """Fill an empty app database; call inside an app context. Returns the item count."""
+    chunk_invoices, chunk_items, item_count = [], [], 0
+    for invoice, items in invoice_rows(invoices, items_per_invoice, clients, seed):
+        chunk_invoices.append(invoice)
+        chunk_items.extend(items)
+        item_count += len(items)
+        if len(chunk_invoices) >= CHUNK:
+            _insert_chunk(appmod, chunk_invoices, chunk_items)
+            chunk_invoices, chunk_items = [], []
+    if chunk_invoices:
+        _insert_chunk(appmod, chunk_invoices, chunk_items)
+    appmod.db.session.commit()
+    appmod.rebuild_daily_revenue()
+    appmod.rebuild_search_index()
+    return item_count
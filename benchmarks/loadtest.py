@@ -0,0 +1,206 @@
+"""Load-test the app under the waitress WSGI server with many concurrent users.
+
+A throwaway database is seeded with benchmarks.datagen and the app is
+booted (``waitress --call app:create_app``) in a separate process on a free
+local port. Each virtual user is a thread with its own HTTP session: it
+logs in through /login, then issues requests drawn from a weighted mix
+until the test duration is up.
+Latency percentiles, error rates and throughput are reported per request
+type and overall, and optionally saved as JSON.
+
+Usage:
+    python -m benchmarks.loadtest [--users 20] [--duration 30] [--server-threads 8]
+        [--mix list=40,view=30,create=10,edit=10,pdf=5,excel=5]
+        [--invoices 1000] [--items 10] [--output FILE]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks import run as bench
+
+DEFAULT_MIX = 'list=40,view=30,create=10,edit=10,pdf=5,excel=5'
+# Request types of the mix -> scenario builders shared with benchmarks.run.
+REQUEST_TYPES = {
+    'list': bench.index,
+    'view': bench.view_invoice,
+    'create': bench.new_invoice,
+    'edit': None,  # drawn from forms prepared before the server starts
+    'pdf': bench.export_pdf,
+    'excel': bench.export_excel,
+}
+EDIT_FORMS = 200
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in REQUEST_TYPES:
+            raise argparse.ArgumentTypeError(f"unknown request type {name!r}; choose from "
+                                             f"{', '.join(REQUEST_TYPES)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, threads, env, log_path):
+    # Server output goes to a file: a full pipe nobody reads would stall the server.
+    with open(log_path, 'wb') as log:
+        process = subprocess.Popen([sys.executable, '-m', 'waitress', '--host=127.0.0.1', f'--port={port}',
+                                    f'--threads={threads}', '--call', 'app:create_app'],
+                                   cwd=bench.ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path) as log:
+                sys.exit(f"Server exited during startup:\n{log.read()}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    sys.exit("Server did not start listening within 60s")
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, base_url, mix, ctx, edit_forms, deadline, seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.names, self.weights = list(mix), list(mix.values())
+        self.ctx = ctx
+        self.edit_forms = edit_forms
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.samples = defaultdict(list)  # request type -> [(seconds, ok)]
+
+    def request(self, session, name, method, url, form):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + url, data=form, allow_redirects=False,
+                                       timeout=60)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        self.samples[name].append((time.perf_counter() - started, ok))
+        return ok
+
+    def run(self):
+        with requests.Session() as session:
+            if not self.request(session, 'login', 'POST', '/login',
+                                {'username': bench.USERNAME, 'password': bench.PASSWORD}):
+                return
+            while time.monotonic() < self.deadline:
+                name = self.rng.choices(self.names, self.weights)[0]
+                if name == 'edit':
+                    method, url, form = self.rng.choice(self.edit_forms)
+                else:
+                    method, url, form = REQUEST_TYPES[name](self.ctx, self.rng)
+                self.request(session, name, method, url, form)
+
+
+def summarize(samples, elapsed):
+    timings = [seconds for seconds, _ in samples]
+    errors = sum(not ok for _, ok in samples)
+    result = bench.summarize(timings, errors, elapsed)
+    result['error_rate'] = round(errors / len(samples), 4) if samples else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20, help="concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds of load")
+    parser.add_argument('--server-threads', type=int, default=8, help="waitress worker threads")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"weighted request mix (default: {DEFAULT_MIX})")
+    parser.add_argument('--invoices', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='invoice-load-')
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'load.db'),
+               PDF_CACHE_DIR=os.path.join(workdir, 'pdf_cache'),
+               EXPORT_DIR=os.path.join(workdir, 'exports'),
+               LOG_FILE=os.path.join(workdir, 'app.log'),
+               SECRET_KEY_FILE=os.path.join(workdir, 'secret_key'))
+    os.environ.update(env)
+    sys.path.insert(0, bench.ROOT)
+    import app as appmod
+    from benchmarks.datagen import seed_database
+
+    app = appmod.create_app()
+    ctx = {'appmod': appmod, 'app': app, 'invoices': args.invoices, 'items': args.items, 'clients': args.clients}
+    with app.app_context():
+        appmod.init_db()
+        seed_database(appmod, args.invoices, args.items, args.clients, args.seed)
+        rng = random.Random(args.seed)
+        edit_forms = [bench.edit_invoice(ctx, rng) for _ in range(EDIT_FORMS)] if 'edit' in args.mix else []
+        appmod.db.engine.dispose()
+
+    port = free_port()
+    server = start_server(port, args.server_threads, env, os.path.join(workdir, 'server.log'))
+    try:
+        deadline = time.monotonic() + args.duration
+        users = [VirtualUser(f"http://127.0.0.1:{port}", args.mix, ctx, edit_forms, deadline, args.seed + n)
+                 for n in range(args.users)]
+        started = time.perf_counter()
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    samples = defaultdict(list)
+    for user in users:
+        for name, values in user.samples.items():
+            samples[name].extend(values)
+    results = {name: summarize(values, elapsed) for name, values in sorted(samples.items())}
+    # Logins are one-off setup per user (and bcrypt-bound), so "all" covers the mix only.
+    results['all'] = summarize([value for name, values in samples.items() if name != 'login'
+                                for value in values], elapsed)
+
+    print(f"{args.users} users, {args.server_threads} server threads, {elapsed:.1f}s")
+    print(f"{'request':<8} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['requests']:>7} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+              f"{result['p99_ms']:>8.1f} {result['throughput_rps']:>8.1f} {result['error_rate']:>7.2%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'commit': bench.git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+                'environment': bench.environment(),
+                'results': results,
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""Measure route latency and throughput through the Flask test client.
+
+A fresh database is seeded with benchmarks.datagen, the default user logs
+in, and each scenario issues a fixed number of sequential requests after a
+short warm-up. Per-scenario latency percentiles and throughput, the run
+parameters, the environment and the git commit are written as JSON, so runs
+from different commits can be compared with --compare.
+
+SQL statements are counted per request as well. The invoice list must cost
+the same number of queries for a page of one invoice as for a full page;
+if it does not, an N+1 query has crept back in and the run exits non-zero.
+
+Usage:
+    python -m benchmarks.run [--invoices 1000] [--items 10] [--clients 100]
+                             [--requests 200] [--scenarios index view_invoice ...]
+                             [--pdf-cache] [--output FILE] [--compare OLD.json]
+                             [--index-page-size 100]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+USERNAME, PASSWORD = "IhArmayau", "H4b!b0Ar"
+
+
+# --- Scenarios: each returns (method, url, form) for one request ---
+def index(ctx, rng):
+    return 'GET', '/', None
+
+
+def view_invoice(ctx, rng):
+    return 'GET', f"/invoice/{rng.randint(1, ctx['invoices'])}/view", None
+
+
+def export_pdf(ctx, rng):
+    return 'GET', f"/invoice/{rng.randint(1, ctx['invoices'])}/pdf", None
+
+
+def export_excel(ctx, rng):
+    return 'GET', f"/invoice/{rng.randint(1, ctx['invoices'])}/excel", None
+
+
+def new_invoice(ctx, rng):
+    count = max(1, ctx['items'])
+    return 'POST', '/invoice/new', {
+        'client_name': f"Client {rng.randrange(ctx['clients']):05d}",
+        'tax_rate': '7.5',
+        'discount_rate': '0',
+        'item_name[]': [f"Item {n}" for n in range(count)],
+        'item_qty[]': [str(rng.randrange(1, 20)) for _ in range(count)],
+        'item_price[]': [f"{rng.randrange(100, 100000) / 100:.2f}" for _ in range(count)],
+    }
+
+
+def edit_invoice(ctx, rng):
+    """Re-post a stored invoice with one line's price changed (read outside the timed request)."""
+    appmod = ctx['appmod']
+    with ctx['app'].app_context():
+        invoice = appmod.db.session.get(appmod.Invoice, rng.randint(1, ctx['invoices']))
+        items = [(item.id, item.name, item.qty, item.price) for item in invoice.items]
+        form = {'client_name': invoice.client_name,
+                'tax_rate': str(invoice.tax_rate),
+                'discount_rate': str(invoice.discount_rate)}
+    if items:
+        changed = rng.randrange(len(items))
+        items[changed] = items[changed][:3] + (f"{rng.randrange(100, 100000) / 100:.2f}",)
+    form.update({'item_id[]': [str(item[0]) for item in items],
+                 'item_name[]': [item[1] for item in items],
+                 'item_qty[]': [str(item[2]) for item in items],
+                 'item_price[]': [str(item[3]) for item in items]})
+    return 'POST', f"/invoice/{invoice.id}/edit", form
+
+
+SCENARIOS = {fn.__name__: fn for fn in
+             (index, view_invoice, new_invoice, edit_invoice, export_pdf, export_excel)}
+
+
+# --- Measurement ---
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, round(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(timings, errors, elapsed):
+    timings = sorted(timings)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None  # noqa: E731
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'mean_ms': ms(sum(timings) / len(timings)) if timings else None,
+        'min_ms': ms(timings[0]) if timings else None,
+        'p50_ms': ms(percentile(timings, 0.50)),
+        'p95_ms': ms(percentile(timings, 0.95)),
+        'p99_ms': ms(percentile(timings, 0.99)),
+        'max_ms': ms(timings[-1]) if timings else None,
+        'throughput_rps': round(len(timings) / elapsed, 2) if elapsed else None,
+    }
+
+
+class QueryCounter:
+    """Counts statements sent through an engine (the event the app's SQL timer uses)."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def run_scenario(client, scenario, ctx, requests, warmup, seed):
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        method, url, form = scenario(ctx, rng)
+        client.open(url, method=method, data=form).close()
+    counter = ctx['queries']
+    timings, queries, errors, elapsed = [], [], 0, 0.0
+    for _ in range(requests):
+        method, url, form = scenario(ctx, rng)
+        counter.count = 0
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=form)
+        response.get_data()  # include streaming the body, as a real client would
+        timings.append(time.perf_counter() - started)
+        queries.append(counter.count)
+        elapsed += timings[-1]
+        errors += response.status_code >= 400
+        response.close()
+    result = summarize(timings, errors, elapsed)
+    result['queries_min'], result['queries_max'] = (min(queries), max(queries)) if queries else (None, None)
+    return result
+
+
+def index_query_counts(client, counter, page_sizes):
+    """SQL statements of one invoice list request per page size (after a warm-up request)."""
+    counts = {}
+    for size in page_sizes:
+        client.get(f'/?per_page={size}').close()
+        counter.count = 0
+        client.get(f'/?per_page={size}').close()
+        counts[size] = counter.count
+    return counts
+
+
+# --- Results ---
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlite': sqlite3.sqlite_version,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(old, new):
+    print(f"\n{'scenario':<14} {'old p50':>9} {'new p50':>9} {'change':>8} "
+          f"{'old rps':>9} {'new rps':>9} {'queries':>9}   vs {old.get('commit')}")
+    for name, result in new['scenarios'].items():
+        before = old.get('scenarios', {}).get(name)
+        if not before or not before['p50_ms'] or not result['p50_ms']:
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+        queries = f"{before.get('queries_max', '?')}->{result['queries_max']}"
+        print(f"{name:<14} {before['p50_ms']:>9.2f} {result['p50_ms']:>9.2f} {change:>+7.1f}% "
+              f"{before['throughput_rps']:>9.1f} {result['throughput_rps']:>9.1f} {queries:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invoices', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=10, help="average items per invoice")
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help="timed requests per scenario")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--pdf-cache', action='store_true',
+                        help="keep the PDF cache on (by default every export_pdf request renders)")
+    parser.add_argument('--output', help="result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument('--compare', help="earlier result file to compare against")
+    parser.add_argument('--index-page-size', type=int, default=100,
+                        help="full page for the invoice list query-count check, compared with a page of 1")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='invoice-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['PDF_CACHE_DIR'] = os.path.join(workdir, 'pdf_cache')
+    os.environ['EXPORT_DIR'] = os.path.join(workdir, 'exports')
+    os.environ['LOG_FILE'] = os.path.join(workdir, 'app.log')
+    os.environ['SECRET_KEY_FILE'] = os.path.join(workdir, 'secret_key')
+    if not args.pdf_cache:
+        os.environ['PDF_CACHE_MAX_BYTES'] = '0'
+    sys.path.insert(0, ROOT)
+    import app as appmod
+    from benchmarks.datagen import seed_database
+
+    started = time.perf_counter()
+    app = appmod.create_app()
+    with app.app_context():
+        appmod.init_db()
+        item_count = seed_database(appmod, args.invoices, args.items, args.clients, args.seed)
+    print(f"Seeded {args.invoices} invoices / {item_count} items in {time.perf_counter() - started:.1f}s")
+
+    client = app.test_client()
+    response = client.post('/login', data={'username': USERNAME, 'password': PASSWORD})
+    if response.status_code != 302:
+        sys.exit(f"Login failed with status {response.status_code}")
+
+    with app.app_context():
+        counter = QueryCounter(appmod.db.engine)
+    ctx = {'appmod': appmod, 'app': app, 'invoices': args.invoices, 'items': args.items, 'clients': args.clients,
+           'queries': counter}
+    results = {}
+    print(f"{'scenario':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7} {'queries':>8}")
+    for n, name in enumerate(args.scenarios):
+        result = results[name] = run_scenario(client, SCENARIOS[name], ctx, args.requests,
+                                              args.warmup, args.seed + n)
+        queries = f"{result['queries_min']}-{result['queries_max']}"
+        print(f"{name:<14} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['throughput_rps']:>8.1f} {result['errors']:>7} {queries:>8}")
+
+    index_queries = index_query_counts(client, counter, (1, max(1, min(args.index_page_size, args.invoices))))
+    index_constant = len(set(index_queries.values())) == 1
+    print(f"Invoice list queries by page size: "
+          f"{', '.join(f'{size}: {count}' for size, count in index_queries.items())} "
+          f"({'constant' if index_constant else 'NOT constant: N+1 query on the invoice list'})")
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'environment': environment(),
+        'scenarios': results,
+        'index_queries': {str(size): count for size, count in index_queries.items()},
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    if not index_constant:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import atexit
+import logging
+import multiprocessing
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Attributes every LogRecord has; anything else on a record came in through ``extra=``.
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+log_queue = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra=`` fields of the record."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """Like QueueHandler, but keeps the traceback out of the message text."""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _route_root_logger(queue, level):
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(queue))
+    root.setLevel(level)
+
+
+@contextmanager
+def _rollover_lock(path):
+    """Hold an exclusive lock on ``<path>.lock`` across processes; yields the lock file.
+
+    The lock file also records when the log was last rotated, as text.
+    """
+    with open(path + '.lock', 'a+') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield lock
+        finally:
+            lock.flush()  # before unlocking, so the next holder reads what was written
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _SharedRolloverMixin:
+    """Rollover that is safe when several processes write the same file.
+
+    Every server process (each gunicorn worker, the reloader's child) logs
+    to the same path. Any of them may rotate it, but only under
+    _rollover_lock, and only after checking again that the file on disk
+    still needs it: another process may have just rotated it, in which
+    case this one only reopens. Before each record the handler also
+    reopens the file if it was rotated away, as WatchedFileHandler does.
+    """
+
+    def emit(self, record):
+        try:
+            self._reopen_if_rotated()
+            if self.shouldRollover(record):
+                with _rollover_lock(self.baseFilename) as lock:
+                    self._reopen_if_rotated()
+                    lock.seek(0)
+                    last = float(lock.read() or 0)
+                    if self._still_due(record, last):
+                        self.doRollover()
+                        lock.seek(0)
+                        lock.truncate()
+                        lock.write(repr(time.time()))
+            logging.FileHandler.emit(self, record)
+        except Exception:
+            self.handleError(record)
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            on_disk = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            on_disk = None
+        opened = os.fstat(self.stream.fileno())
+        if on_disk is None or (on_disk.st_dev, on_disk.st_ino) != (opened.st_dev, opened.st_ino):
+            self.stream.close()
+            self.stream = self._open()
+
+
+class _SharedRotatingFileHandler(_SharedRolloverMixin, RotatingFileHandler):
+    def _still_due(self, record, last_rollover):
+        return self.shouldRollover(record)  # measures the current file, including other writers' lines
+
+
+class _SharedTimedRotatingFileHandler(_SharedRolloverMixin, TimedRotatingFileHandler):
+    def _still_due(self, record, last_rollover):
+        if last_rollover >= self.rolloverAt:
+            # Another process already rotated for this interval.
+            self.rolloverAt = self.computeRollover(int(time.time()))
+            return False
+        return True
+
+
+def configure_logging(path, level='INFO', max_bytes=10 * 1024 * 1024, backup_count=5, when=None):
+    """Send all logging through a queue to a rotating JSON-lines file.
+
+    Callers only enqueue records; a QueueListener thread does the formatting
+    and disk writes, so request threads never wait on the file. The file
+    rotates at ``max_bytes``, or on the ``when`` schedule (e.g. 'midnight')
+    when one is given. The queue is a multiprocessing queue so pool workers
+    can share the one writer (see attach_worker). Returns the queue.
+
+    Several server processes may share the file; rotation is coordinated
+    between them through a lock file (see _SharedRolloverMixin).
+    """
+    global _listener, log_queue
+    if _listener is not None:
+        return log_queue
+    if when:
+        handler = _SharedTimedRotatingFileHandler(path, when=when, backupCount=backup_count,
+                                                  encoding='utf-8', delay=True)
+    else:
+        handler = _SharedRotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                             encoding='utf-8', delay=True)
+    handler.setFormatter(JSONFormatter())
+    log_queue = multiprocessing.get_context('spawn').Queue(-1)  # usable by spawned and forked children
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    _route_root_logger(log_queue, level)
+    return log_queue
+
+
+def attach_worker(queue, level='INFO'):
+    """In a child process: log into the parent's queue instead of a file of our own."""
+    global _listener, log_queue
+    if _listener is not None and log_queue is not queue:
+        # A spawned child imported the app and started its own listener; retire it.
+        _listener.stop()
+    _listener, log_queue = None, queue
+    _route_root_logger(queue, level)
+
+
+def stop_logging():
+    """Flush queued records to disk and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,154 @@
+import os
+import glob
+import json
+import hashlib
+import time
+import tempfile
+import threading
+
+
+class PDFCache:
+    """Size-bounded, content-addressed cache of rendered PDFs on local disk.
+
+    Files are named ``invoice_<id>_<sha256>.pdf`` where the hash covers
+    everything that ends up on the page, so a changed invoice can never be
+    served a stale file. Eviction is least-recently-used by modification
+    time, which is refreshed on every hit.
+
+    The total size is kept in memory, so a put only walks the directory
+    when the cache is over budget. The total is re-measured every
+    RESCAN_SECONDS to pick up files that other server processes added.
+    """
+
+    RESCAN_SECONDS = 300
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._bytes = None  # unknown until the first scan
+        self._scanned_at = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def content_key(content):
+        """Hash any JSON-serializable description of the document."""
+        payload = json.dumps(content, sort_keys=True, default=str, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, invoice_id, key):
+        return os.path.join(self.directory, f"invoice_{invoice_id}_{key}.pdf")
+
+    def get(self, invoice_id, key):
+        """Return the cached PDF opened for reading, or None on a miss.
+
+        The file is opened here rather than handing out a path, so an
+        eviction by another request between lookup and send is a miss
+        instead of a FileNotFoundError halfway through the response.
+        """
+        path = self._path(invoice_id, key)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # evicted after we opened it; the open handle still reads fine
+        with self._lock:
+            self.hits += 1
+        return f
+
+    def put(self, invoice_id, key, data):
+        """Store rendered bytes and evict down to max_bytes.
+
+        Documents larger than the whole cache are not stored at all: they
+        would only push out every other entry and then themselves.
+        """
+        if len(data) > self.max_bytes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(invoice_id, key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        replaced = self._size(path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += len(data) - replaced
+            needs_scan = (self._bytes is None or self._bytes > self.max_bytes
+                          or time.monotonic() - self._scanned_at > self.RESCAN_SECONDS)
+        if needs_scan:
+            self.evict()
+
+    def invalidate(self, invoice_id):
+        for path in glob.glob(os.path.join(self.directory, f"invoice_{invoice_id}_*.pdf")):
+            size = self._size(path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                if self._bytes is not None:
+                    self._bytes -= size
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _entries(self):
+        """Return (mtime, size, path) of every cached file, skipping any removed meanwhile."""
+        try:
+            dir_entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return []
+        entries = []
+        for entry in dir_entries:
+            if not entry.name.endswith('.pdf') or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # removed by a concurrent eviction
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Re-measure the cache and remove least-recently-used files until it fits in max_bytes."""
+        entries = sorted(self._entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue  # still open by a reader on Windows; try again on a later put
+            size -= entry_size
+        with self._lock:
+            self._bytes, self._scanned_at = size, time.monotonic()
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'entries': len(entries),
+            'bytes': sum(entry_size for _, entry_size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
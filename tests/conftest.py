@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as appmod  # noqa: E402
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build apps on fresh SQLite databases under tmp_path, schema and default user in place."""
+    def make(name='app'):
+        workdir = tmp_path / name
+        application = appmod.create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{workdir / 'invoices.db'}",
+            'SECRET_KEY_FILE': str(workdir / 'secret_key'),
+            'PDF_CACHE_DIR': str(workdir / 'pdf_cache'),
+            'EXPORT_DIR': str(workdir / 'exports'),
+            'LOG_FILE': str(tmp_path / 'app.log'),
+        })
+        with application.app_context():
+            appmod.init_db()
+        return application
+    return make
+
+
+def login(client):
+    response = client.post('/login', data={'username': "IhArmayau", 'password': "H4b!b0Ar"})
+    assert response.status_code == 302
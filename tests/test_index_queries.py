@@ -0,0 +1,29 @@
+"""The invoice list must cost the same number of queries for one invoice as for a full page."""
+from sqlalchemy import event
+
+import app as appmod
+from benchmarks.datagen import seed_database
+from conftest import login
+
+
+def index_queries(application, invoices):
+    """Seed ``invoices`` invoices and return the statements one GET / issues, and the rows shown."""
+    with application.app_context():
+        seed_database(appmod, invoices, items_per_invoice=3, clients=5)
+        statements = []
+        event.listen(appmod.db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+    client = application.test_client()
+    login(client)
+    client.get('/').close()  # warm-up
+    statements.clear()
+    response = client.get('/')
+    assert response.status_code == 200
+    return statements, response.get_data(as_text=True).count('/view"')
+
+
+def test_index_query_count_does_not_grow_with_invoices(make_app):
+    one, one_rows = index_queries(make_app('one'), 1)
+    many, many_rows = index_queries(make_app('many'), 40)
+    assert (one_rows, many_rows) == (1, 40)
+    assert len(one) == len(many), "\n".join(many)
@@ -0,0 +1,75 @@
+from array import array
+from decimal import Decimal, ROUND_HALF_UP
+
+# Money is carried as integer minor units (cents) and rates as integer
+# thousandths of a percent, so every sum and product below is exact; the
+# only rounding is one half-up step per tax/discount amount.
+MINOR_UNITS = 100
+RATE_SCALE = 1000
+CENT = Decimal('0.01')
+
+
+def to_decimal(value):
+    """Parse a price or amount (str, int, float or Decimal) into a Decimal rounded to cents."""
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_minor(amount):
+    return int(to_decimal(amount) * MINOR_UNITS)
+
+
+def to_rate_units(rate):
+    return int((Decimal(str(rate or 0)) * RATE_SCALE).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor):
+    return Decimal(minor).scaleb(-2)
+
+
+def _percent_of(minor, rate_units):
+    """minor * rate% rounded half away from zero, in integer arithmetic."""
+    denominator = 100 * RATE_SCALE
+    numerator = minor * rate_units
+    sign = -1 if numerator < 0 else 1
+    return sign * ((abs(numerator) * 2 + denominator) // (2 * denominator))
+
+
+def totals_batch(invoices, lines):
+    """Compute (subtotal, tax_amount, discount_amount, total) for many invoices in one pass.
+
+    ``invoices`` yields (invoice_id, tax_rate, discount_rate) and ``lines``
+    yields (invoice_id, qty, price) for any number of invoices, in any
+    order. Each input column is packed into an array of 64-bit integers and
+    the per-invoice sums are accumulated over those arrays. Returns a dict
+    mapping invoice_id to a tuple of Decimals.
+    """
+    ids, tax_rates, discount_rates = array('q'), array('q'), array('q')
+    for invoice_id, tax_rate, discount_rate in invoices:
+        ids.append(invoice_id)
+        tax_rates.append(to_rate_units(tax_rate))
+        discount_rates.append(to_rate_units(discount_rate))
+    position = {invoice_id: n for n, invoice_id in enumerate(ids)}
+
+    line_invoice, line_amount = array('q'), array('q')
+    for invoice_id, qty, price in lines:
+        line_invoice.append(position[invoice_id])
+        line_amount.append(int(qty) * to_minor(price))
+
+    subtotals = array('q', bytes(8 * len(ids)))
+    for n, amount in zip(line_invoice, line_amount):
+        subtotals[n] += amount
+
+    results = {}
+    for n, invoice_id in enumerate(ids):
+        subtotal = subtotals[n]
+        tax = _percent_of(subtotal, tax_rates[n])
+        discount = _percent_of(subtotal, discount_rates[n])
+        results[invoice_id] = (from_minor(subtotal), from_minor(tax),
+                               from_minor(discount), from_minor(subtotal + tax - discount))
+    return results
+
+
+def invoice_totals(lines, tax_rate, discount_rate):
+    """Totals for a single invoice given (qty, price) pairs."""
+    return totals_batch([(0, tax_rate, discount_rate)],
+                        ((0, qty, price) for qty, price in lines))[0]